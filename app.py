@@ -1,9 +1,11 @@
 
+from constant import *
 from config import *
 from data import *
 from ui import *
 import dash_bootstrap_components as dbc
 import pandas as pd
+import diskcache
 import warnings
 import dash
 import os
@@ -12,7 +14,10 @@ initialize_data()
 
 if not os.path.exists('./out/'): os.mkdir('./out')
 
-app = dash.Dash(__name__, use_pages = True, external_stylesheets = [dbc.themes.SANDSTONE])
+# Backtests run as background jobs queued on disk, keeping the web workers free
+background_callback_manager = dash.DiskcacheManager(diskcache.Cache(JOB_CACHE_PATH))
+
+app = dash.Dash(__name__, use_pages = True, external_stylesheets = [dbc.themes.SANDSTONE], background_callback_manager = background_callback_manager)
 
 app.title = 'Mind-Wealth'
 app.layout = get_app_layout()
@@ -0,0 +1,150 @@
+
+import subprocess
+import time
+import sys
+
+# Parse `python -X importtime` output of importing a module
+# Returns (name, depth, self_us, cumulative_us) in import order
+def get_import_profile(module):
+	proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], capture_output = True, text = True)
+	rows = []
+
+	for line in proc.stderr.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line: continue
+
+		self_us, cum_us, name = line[len('import time:'):].split('|')
+		depth = (len(name) - len(name.lstrip())) // 2
+
+		rows.append((name.strip(), depth, int(self_us), int(cum_us)))
+
+	return rows
+
+# Report total import time of a module and the packages it spends it in
+def bench_import_time(module = 'compute', top = 15):
+	rows = get_import_profile(module)
+	total = [r for r in rows if r[0] == module][-1][-1]
+	packages = {}
+
+	for name, _, self_us, _ in rows:
+		package = name.split('.')[0]
+		packages[package] = packages.get(package, 0) + self_us
+
+	print('import {}: {:.1f} ms'.format(module, total / 1000))
+
+	for package, self_us in sorted(packages.items(), key = lambda p: -p[1])[:top]:
+		print('  {:<30} {:>8.1f} ms'.format(package, self_us / 1000))
+
+# Best wall time of a call over a number of runs, in milliseconds
+def get_best_time(fn, *args, runs = 5):
+	best = None
+
+	for _ in range(runs):
+		start = time.perf_counter()
+		fn(*args)
+		elapsed = (time.perf_counter() - start) * 1000
+
+		if best is None or elapsed < best: best = elapsed
+
+	return best
+
+# Time Zig-Zag pivot detection over the whole stored history of symbols
+def bench_zigzag(symbols = ('AAPL', 'AMZN', 'BTC-USD')):
+	from compute import get_zigzag
+	from store import load_price_store, get_price_store_path
+
+	for symbol in symbols:
+		df = load_price_store(get_price_store_path(symbol))
+		pivots = get_zigzag(df, df.index[-1])
+
+		print('get_zigzag {}: {} bars, {} pivots, {:.2f} ms'.format(symbol, len(df), len(pivots), get_best_time(get_zigzag, df, df.index[-1])))
+
+# Time turning point detection over the whole stored close history of symbols, without (cold) and with (warm) the memo
+def bench_turning_points(symbols = ('AAPL', 'AMZN', 'BTC-USD'), ratios = (1.02, 1.1)):
+	from compute import getPointsforArray, turning_caches
+	from store import load_price_store, get_price_store_path
+
+	def get_cold_points(series, R):
+		turning_caches.clear()
+		return getPointsforArray(series, R)
+
+	for symbol in symbols:
+		series = load_price_store(get_price_store_path(symbol))['Close']
+
+		for R in ratios:
+			highs, lows = getPointsforArray(series, R)
+			cold, warm = get_best_time(get_cold_points, series, R), get_best_time(getPointsforArray, series, R)
+
+			print('getPointsforArray {} R={}: {} points, {:.2f} ms cold, {:.2f} ms warm'.format(symbol, R, len(highs) + len(lows), cold, warm))
+
+# Time the R search of getPointsBest (cold memo) over the whole stored close history of symbols
+def bench_turning_ratio(symbols = ('AAPL', 'AMZN', 'BTC-USD'), min_ = 0.23, max_ = 0.8):
+	from compute import getScaledY, search_turning_ratio, turning_caches
+	from store import load_price_store, get_price_store_path
+
+	for symbol in symbols:
+		values = load_price_store(get_price_store_path(symbol))['Close'].to_numpy()
+		scaled = getScaledY(values)
+		R, _ = search_turning_ratio(values, scaled, min_, max_)
+		turning_caches.clear()
+
+		print('search_turning_ratio {}: R={:.3f}, {:.2f} ms'.format(symbol, R, get_best_time(search_turning_ratio, values, scaled, min_, max_, runs = 1)))
+
+# Time the trendline backtest over the whole stored history of symbols
+def bench_trendline(symbols = ('AAPL', 'BTC-USD')):
+	from compute import backtest_trendline
+	from store import load_price_store, get_price_store_path
+	from constant import YMD_FORMAT, INTERVAL_DAILY
+
+	for symbol in symbols:
+		df = load_price_store(get_price_store_path(symbol))
+		from_date, to_date = df.index[0].strftime(YMD_FORMAT), df.index[-1].strftime(YMD_FORMAT)
+		elapsed = get_best_time(lambda: backtest_trendline(df.copy(), symbol, from_date, to_date, INTERVAL_DAILY), runs = 1)
+
+		print('backtest_trendline {}: {} bars, {:.2f} ms'.format(symbol, len(df), elapsed))
+
+# Time the Fibonacci extension merge over synthetic downfall sets, each downfall a pair of random-walk pivots
+def bench_fib_extensions(downfall_counts = (1000, 5000), merge_thres = 0.04):
+	from compute import get_fib_extensions
+	import pandas as pd
+	import numpy as np
+
+	rng = np.random.default_rng(0)
+
+	for count in downfall_counts:
+		dates = pd.date_range('2000-01-01', periods = 2 * count, freq = 'D')
+		zdf = pd.DataFrame({'close': 100 * np.exp(np.cumsum(rng.normal(0, 0.05, 2 * count)))}, index = dates)
+		downfalls = [(dates[2 * i], dates[2 * i + 1]) for i in range(count)]
+
+		limit_low, limit_high = zdf['close'].min() * 0.05, zdf['close'].max() * 5
+		groups = get_fib_extensions(zdf, downfalls, merge_thres, limit_low, limit_high)
+
+		print('get_fib_extensions {} downfalls: {} levels, {} groups, {:.2f} ms'.format(
+			count, sum(len(g) for g in groups), len(groups),
+			get_best_time(get_fib_extensions, zdf, downfalls, merge_thres, limit_low, limit_high, runs = 3)
+		))
+
+# Time the Fibonacci extension backtest in each level mode over the whole stored daily history of symbols
+def bench_fib_ext_backtest(symbols = ('AAPL', 'BTC-USD'), pivot_number = 3, merge_thres = 0.02):
+	from compute import backtest_fib_extension, load_yf
+	from constant import YMD_FORMAT, INTERVAL_DAILY, FIB_EXT_MODE_ALL
+	from store import load_price_store, get_price_store_path
+
+	for symbol in symbols:
+		dates = load_price_store(get_price_store_path(symbol)).index
+		from_date, to_date = dates[0].strftime(YMD_FORMAT), dates[-1].strftime(YMD_FORMAT)
+		df = load_yf(symbol, from_date, to_date, INTERVAL_DAILY)
+
+		for mode in FIB_EXT_MODE_ALL:
+			print('backtest_fib_extension {} ({}): {} bars, {:.2f} ms'.format(symbol, mode, len(df), get_best_time(
+				lambda: backtest_fib_extension(df, INTERVAL_DAILY, pivot_number, merge_thres, symbol, from_date, to_date, mode = mode), runs = 3
+			)))
+
+if __name__ == '__main__':
+	bench_import_time('compute')
+	bench_import_time('yahoo')
+	bench_zigzag()
+	bench_turning_points()
+	bench_turning_ratio()
+	bench_trendline()
+	bench_fib_extensions()
+	bench_fib_ext_backtest()
@@ -1,30 +1,56 @@
 
+from concurrent.futures import ProcessPoolExecutor
 from plotly.subplots import make_subplots
 from datetime import date, datetime, timedelta
-from loess.loess_1d import loess_1d
 from collections import defaultdict
 from collections import deque
-from scipy import stats
 from constant import *
-from tqdm import tqdm
-from finta import TA
 from yahoo import *
 from data import *
 from config import *
 from util import *
-import matplotlib.dates as mdates
+from lru import *
+from report import *
+from numpy.lib.stride_tricks import sliding_window_view
 import plotly.graph_objects as go
-import pandas_ta as ta
 import pandas as pd
 import numpy as np
+import threading
+import bisect
+import pickle
 import math
 import copy
 import os
 
+# Analytics dependencies are imported on first use to keep startup light
+loess_1d = LazyImport('loess.loess_1d', 'loess_1d')
+tqdm = LazyImport('tqdm', 'tqdm')
+TA = LazyImport('finta', 'TA')
+mdates = LazyImport('matplotlib.dates')
+ta = LazyImport('pandas_ta')
+
 """
 Core logic modules
 """
 
+# Turning points memoized by (array fingerprint, R)
+turning_caches = LRUCache(turning_cache_budget_mb * 1024 * 1024)
+
+# Iterate over items with a console progress bar
+# Reports (done, total) to on_progress each time another percent of the items is done
+def track_progress(items, on_progress = None, **kwargs):
+	items = list(items)
+	reported = 0
+
+	for i, item in enumerate(tqdm(items, **kwargs)):
+		yield item
+
+		percent = 100 * (i + 1) // len(items)
+
+		if on_progress is not None and percent > reported:
+			on_progress(i + 1, len(items))
+			reported = percent
+
 # Class to store endpoints of a line and handle required requests
 class Linear:
     def __init__(self, x1, y1, x2, y2, startIndex = None, endIndex = None):
@@ -150,19 +176,20 @@ def getReigons(highs, data, stoch = False):
     while i + 1 < len(highs):
         h1 = highs[i]
         h2 = highs[i+1]
-        p1 = data[h1]
-        p2 = data[h2]
-        
-        if p2 > p1 and (p2-p1)/p2 > 0.025:
-            reigons.append(Reigon(h1, h2, 1))
-        elif p2 < p1 and (p1-p2)/p1 > 0.025:
-            reigons.append(Reigon(h1, h2, -1))
-        else:
-            reigons.append(Reigon(h1, h2, 0))
+        reigons.append(Reigon(h1, h2, getReigonClass(data[h1], data[h2])))
             
         i += 1
     return reigons
 
+# Returns the class of a range from its endpoint values: 1 for a rise, -1 for a fall, 0 for flat
+def getReigonClass(p1, p2):
+    if p2 > p1 and (p2-p1)/p2 > 0.025:
+        return 1
+    elif p2 < p1 and (p1-p2)/p1 > 0.025:
+        return -1
+    else:
+        return 0
+
 # Calculate merged regions
 def getFinalReigons(reigons):
     rr = reigons.copy()
@@ -273,81 +300,106 @@ def getClosestPrevIndex(start, data, type):
                     
         return selected
 
-# Get local peak points using Zig-Zag algorithm
-def get_zigzag(df, final_date):
+# Get first positions of maximum and minimum values of each window
+# Windows are non-empty position ranges [starts[k], ends[k]) of the array and may share boundary points
+def get_window_extrema(a, starts, ends):
+	if len(starts) == 0: return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+
+	lengths = ends - starts
+	offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+	# Gather all windows back to back, so that each one is a contiguous segment for reduceat
+	pos = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+	vals = a[pos]
+
+	max_vals = np.maximum.reduceat(vals, offsets)
+	min_vals = np.minimum.reduceat(vals, offsets)
+
+	max_pos = np.minimum.reduceat(np.where(vals == np.repeat(max_vals, lengths), pos, len(a)), offsets)
+	min_pos = np.minimum.reduceat(np.where(vals == np.repeat(min_vals, lengths), pos, len(a)), offsets)
+
+	return max_pos, min_pos
+
+# Get local peak points of a price array using Zig-Zag algorithm
+# Windows of zigzag_window days are laid backwards from final_date, dates must be sorted datetime64 values
+# Returns pivot positions, signs (1 for peaks, -1 for bottoms) and values in date order
+def get_zigzag_pivots(dates, closes, final_date):
+	init_date = dates[0]
+	win_dur = np.timedelta64(zigzag_window, 'D')
+	pad_dur = np.timedelta64(zigzag_padding, 'D')
+
+	last_start_date = np.datetime64(pd.Timestamp(final_date)) - pad_dur - win_dur
+	win_count = (last_start_date - init_date) // win_dur + 1 if last_start_date >= init_date else 0
+
+	win_end_dates = last_start_date + win_dur - np.arange(win_count) * win_dur
+	starts = np.searchsorted(dates, win_end_dates - win_dur, side = 'left')
+	ends = np.searchsorted(dates, win_end_dates, side = 'right')
+
+	valid = ends - starts > 1
+	starts, ends = starts[valid], ends[valid]
+
+	max_pos, min_pos = get_window_extrema(closes, starts, ends)
 	pivots = []
 
-	series = df['Close']
-	init_date = df.index[0]
-	
-	win_dur = timedelta(days = zigzag_window)
-	pad_dur = timedelta(days = zigzag_padding)
-
-	win_end_date = final_date - pad_dur
-	win_start_date = win_end_date - win_dur
-
-	while win_start_date >= init_date:
-		if len(series[win_start_date:win_end_date]) > 1:
-			max_idx = series[win_start_date:win_end_date].idxmax()
-			min_idx = series[win_start_date:win_end_date].idxmin()
-
-			if max_idx < min_idx:
-				if len(pivots) > 0:
-					if pivots[-1][1] > 0:
-						pivots.append((min_idx, -1, series[min_idx]))
-						pivots.append((max_idx, 1, series[max_idx]))
-					elif pivots[-1][2] < series[min_idx]:
-						pivots.append((max_idx, 1, series[max_idx]))
-					else:
-						pivots[-1] = (min_idx, -1, series[min_idx])
-						pivots.append((max_idx, 1, series[max_idx]))
-				else:
-					pivots.append((min_idx, -1, series[min_idx]))
-					pivots.append((max_idx, 1, series[max_idx]))
+	for max_idx, min_idx in zip(max_pos.tolist(), min_pos.tolist()):
+		max_pivot, min_pivot = (max_idx, 1, closes[max_idx]), (min_idx, -1, closes[min_idx])
+
+		if max_idx < min_idx:
+			if len(pivots) > 0:
+				if pivots[-1][1] > 0:
+					pivots.append(min_pivot)
+				elif pivots[-1][2] >= min_pivot[2]:
+					pivots[-1] = min_pivot
 			else:
-				if len(pivots) > 0:
-					if pivots[-1][1] < 0:
-						pivots.append((max_idx, 1, series[max_idx]))
-						pivots.append((min_idx, -1, series[min_idx]))
-					elif pivots[-1][2] > series[max_idx]:
-						pivots.append((min_idx, -1, series[min_idx]))
-					else:
-						pivots[-1] = (max_idx, 1, series[max_idx])
-						pivots.append((min_idx, -1, series[min_idx]))
-				else:
-					pivots.append((max_idx, 1, series[max_idx]))
-					pivots.append((min_idx, -1, series[min_idx]))
+				pivots.append(min_pivot)
 
-		win_end_date -= win_dur
-		win_start_date -= win_dur
+			pivots.append(max_pivot)
+		else:
+			if len(pivots) > 0:
+				if pivots[-1][1] < 0:
+					pivots.append(max_pivot)
+				elif pivots[-1][2] <= max_pivot[2]:
+					pivots[-1] = max_pivot
+			else:
+				pivots.append(max_pivot)
+
+			pivots.append(min_pivot)
 
 	pivots = pivots[::-1]
+	positions = np.array([p[0] for p in pivots], dtype = np.int64)
+	signs = np.array([p[1] for p in pivots], dtype = np.int64)
+	values = np.array([p[2] for p in pivots], dtype = np.float64)
 
 	for _ in range(zigzag_merges):
-		merged_pivots = merge_zigzag_pivots(pivots)		
-		if len(merged_pivots) < 4: break
+		keep = merge_zigzag_pivots(dates[positions], values)
+		if len(keep) < 4: break
 
-		pivots = merged_pivots
+		positions, signs, values = positions[keep], signs[keep], values[keep]
 
-	res = pd.DataFrame(columns = ['Date', 'Sign', 'Close'])
-	
-	for idx, sign, v in pivots:
-		r = {'Date': idx, 'Sign': sign, 'Close': v}
-		res = pd.concat([res, pd.Series(r).to_frame().T], ignore_index = True)
+	return positions, signs, values
 
-	res.set_index('Date', inplace = True)
-	return res
+# Get local peak points using Zig-Zag algorithm
+def get_zigzag(df, final_date):
+	positions, signs, values = get_zigzag_pivots(df.index.values, df['Close'].to_numpy(dtype = np.float64), final_date)
+
+	return pd.DataFrame(
+		{'Sign': signs, 'Close': values},
+		index = pd.DatetimeIndex(df.index.values[positions], name = 'Date')
+	)
 
 # Refine peak points by merging Zig-Zag peaks
-def merge_zigzag_pivots(pivots):
-	if len(pivots) < 3: return pivots	
+# Returns indices of the pivots kept
+def merge_zigzag_pivots(dates, values):
+	if len(dates) < 3: return np.arange(len(dates))
 	res, i = [], 0
 
-	while i < len(pivots) - 3:
-		res.append(pivots[i])
+	dur_limit = np.timedelta64(zigzag_merge_dur_limit, 'D')
+
+	while i < len(dates) - 3:
+		res.append(i)
 
-		if pivots[i + 3][0] - pivots[i][0] < timedelta(days = zigzag_merge_dur_limit):
-			v = [pivots[j][2] for j in range(i, i + 4)]
+		if dates[i + 3] - dates[i] < dur_limit:
+			v = values[i:i + 4]
 
 			if min(v[0], v[3]) < min(v[1], v[2]) and max(v[0], v[3]) > max(v[1], v[2]):
 				if zigzag_merge_val_limit * (max(v[0], v[3]) - min(v[0], v[3])) > (max(v[1], v[2]) - min(v[1], v[2])):
@@ -359,10 +411,8 @@ def merge_zigzag_pivots(pivots):
 		else:
 			i += 1
 
-	for j in range(i, len(pivots)):
-		res.append(pivots[j])
-
-	return res
+	res.extend(range(i, len(dates)))
+	return np.array(res, dtype = np.int64)
 
 # Get recent downfall pivot pairs from Zig-Zag peak points
 def get_recent_downfalls(zdf, count):
@@ -449,116 +499,126 @@ def get_recent_downfalls_old(symbol, from_date, to_date, count):
 
 # Get Fibonacci extension levels from a given set of downfall pivot pairs
 def get_fib_extensions(zdf, downfalls, merge_thres, limit_low, limit_high):
-	all_levels = []
+	if len(downfalls) == 0: return []
 
-	for i, f in enumerate(downfalls):
-		hd, zd = f
-		hv, zv = zdf.loc[hd]['close'], zdf.loc[zd]['close']
-		dv = hv - zv
+	hvs = zdf['close'].loc[[hd for hd, _ in downfalls]].to_numpy()
+	zvs = zdf['close'].loc[[zd for _, zd in downfalls]].to_numpy()
 
-		for j, l in enumerate(FIB_EXT_LEVELS):
-			lv = zv + dv * l
-			if lv < limit_low or lv > limit_high: continue
+	return get_fib_extension_groups(downfalls, hvs, zvs, merge_thres, limit_low, limit_high)
 
-			all_levels.append((i, hd, zd, hv, zv, j, round(lv, 4)))
+# Fibonacci extension levels of downfalls given with their hundred and zero values, merged and sorted
+def get_fib_extension_groups(downfalls, hvs, zvs, merge_thres, limit_low, limit_high):
+	if len(downfalls) == 0: return []
 
-	all_levels.sort(key = lambda x: x[-1])
-	res, flags = [], []
+	# Level j of downfall i at [i, j], sorted (stably) by value
+	lvs = zvs[:, None] + (hvs - zvs)[:, None] * np.array(FIB_EXT_LEVELS)
 
-	for i, level in enumerate(all_levels):
-		if i in flags: continue
+	ii, jj = np.nonzero(~((lvs < limit_low) | (lvs > limit_high)))
+	lvs = np.round(lvs[ii, jj], 4)
+	order = np.argsort(lvs, kind = 'stable')
 
-		lv = level[-1]
-		th = lv * merge_thres
+	all_levels = [(i, *downfalls[i], hvs[i], zvs[i], j, lv) for i, j, lv in zip(ii[order].tolist(), jj[order].tolist(), lvs[order])]
 
-		flags.append(i)		
-		g = [level]
+	starts = get_level_groups([level[-1] for level in all_levels], merge_thres).tolist()
+	return [all_levels[s:e] for s, e in zip(starts, starts[1:] + [len(all_levels)])]
 
-		for j in range(i + 1, len(all_levels)):
-			if j in flags: continue
-			v = all_levels[j][-1]
+# Merge ascending level values into groups in one sweep
+# A value joins the group of the previous one when it is within merge_thres (relative to the group's first value) of it
+# Returns the start position of each group, so that group k is values[starts[k]:starts[k + 1]]
+def get_level_groups(values, merge_thres):
+	starts = []
+	lv, th = None, None
 
-			if v - lv <= th:
-				flags.append(j)
-				g.append(all_levels[j])
+	for k, v in enumerate(values):
+		if lv is None or v - lv > th:
+			starts.append(k)
+			th = v * merge_thres
 
-				lv = v
+		lv = v
 
-		res.append(g)
-
-	return res
+	return np.array(starts, dtype = np.int64)
 
 # Compute behaviors of Fibonacci extension levels
+# A level is classified by the first candle crossing it, the close at a milestone FIB_BEHAVIOR_MILESTONE days later
+# (or the first of the halved spans that still ends before the last candle) and the closes in between
 def get_fib_ext_behaviors(df, extensions, cur_date, merge_thres):
 	res = {}
-	cur_price = df.iloc[-1]['close']
+	is_resist = True#(lv >= cur_price)
 
-	for g in extensions:
-		lv = (g[0][-1] + g[-1][-1]) / 2
-		is_resist = True#(lv >= cur_price)
+	dates, calendar = df.index.values, TradingCalendar(df.index)
+	opens, closes = df['open'].to_numpy(dtype = np.float64), df['close'].to_numpy(dtype = np.float64)
+	n, count = len(df), len(extensions)
 
-		behavior, pv, start_date = None, None, None
+	levels = np.array([(g[0][-1] + g[-1][-1]) / 2 for g in extensions], dtype = np.float64)
+	thres = levels * merge_thres
 
-		#for d in df.loc[cur_date:].iloc:
-		for d in df.iloc:
-			#v = d.high if is_resist else d.low
-			v = max(d.open, d.close) if is_resist else min(d.open, d.close)
+	# A level is crossed when the body of a candle reaches it from the other side of the previous candle's low (high)
+	values = np.where(closes > opens, closes, opens) if is_resist else np.where(closes < opens, closes, opens)
+	prev_values = df['low' if is_resist else 'high'].to_numpy(dtype = np.float64)
 
-			if pv is not None:
-				if (pv < lv and v >= lv) or (pv > lv and v <= lv):
-					start_date = d.name
-					break
+	lv = levels[:, None]
+	crossed = ((prev_values[None, :-1] < lv) & (values[None, 1:] >= lv)) | ((prev_values[None, :-1] > lv) & (values[None, 1:] <= lv))
+	has_start = crossed.any(axis = 1) if n > 1 else np.zeros(count, dtype = bool)
+	starts = crossed.argmax(axis = 1) + 1 if n > 1 else np.zeros(count, dtype = np.int64)
 
-			pv = d.low if is_resist else d.high
+	# Milestones with the span left for the end date, searching forward from start + span for halving spans
+	milestones, forwards = np.zeros(count, dtype = np.int64), np.zeros(count, dtype = np.int64)
+	pending = has_start.copy()
+	milestone_forward = FIB_BEHAVIOR_MILESTONE
 
-		if start_date is not None:
-			milestone_forward = FIB_BEHAVIOR_MILESTONE
-			milestone_date = None
+	while milestone_forward >= 5 and pending.any():
+		found = calendar.get_forward_positions(dates[starts[pending]] + np.timedelta64(milestone_forward, 'D'))
+		found_at = np.flatnonzero(pending)[found < n]
 
-			while milestone_forward >= 5 and milestone_date is None:
-				milestone_date = get_nearest_forward_date(df, start_date + timedelta(days = milestone_forward))
-				milestone_forward //= 2
+		milestones[found_at], forwards[found_at] = found[found < n], milestone_forward // 2
+		pending[found_at] = False
+		milestone_forward //= 2
 
-			if milestone_date is not None:
-				mlv = df.loc[milestone_date]['close']
-				thres = lv * merge_thres
+	has_milestone = has_start & ~pending
+	ends = calendar.get_forward_positions(dates[milestones] + forwards.astype('timedelta64[D]'))
 
-				has_mid_up, has_mid_down = False, False
+	# Closes far enough above (below) each level, counted over the candles strictly between start and milestone
+	mid_ups = (closes[None, :] - lv) >= thres[:, None]
+	mid_downs = ~mid_ups & ((lv - closes[None, :]) >= thres[:, None])
+	mid_ups = np.concatenate([np.zeros((count, 1), dtype = np.int64), np.cumsum(mid_ups, axis = 1)], axis = 1)
+	mid_downs = np.concatenate([np.zeros((count, 1), dtype = np.int64), np.cumsum(mid_downs, axis = 1)], axis = 1)
 
-				for d in df.loc[df.loc[start_date:milestone_date].index[1:-1]].iloc:
-					if (d.close - lv) >= thres:
-						has_mid_up = True
-					elif (lv - d.close) >= thres:
-						has_mid_down = True
+	for k, g in enumerate(extensions):
+		lv, behavior = levels[k], None
 
-				if (mlv - lv) >= thres:
-					if has_mid_down:
+		if has_milestone[k]:
+			start, milestone = starts[k], milestones[k]
+			mlv = closes[milestone]
+
+			has_mid_up = mid_ups[k, milestone] > mid_ups[k, start + 1]
+			has_mid_down = mid_downs[k, milestone] > mid_downs[k, start + 1]
+
+			if (mlv - lv) >= thres[k]:
+				if has_mid_down:
+					behavior = 'Res_Semi_Break' if is_resist else 'Sup_Semi_Sup'
+				else:
+					behavior = 'Res_Break' if is_resist else 'Sup_Sup'
+			elif (lv - mlv) >= thres[k]:
+				if has_mid_up:
+					behavior = 'Res_Semi_Res' if is_resist else 'Sup_Semi_Break'
+				else:
+					behavior = 'Res_Res' if is_resist else 'Sup_Break'
+			elif has_mid_up == has_mid_down:
+				if ends[k] < n:
+					elv = closes[ends[k]]
+
+					if (elv - lv) >= thres[k]:
 						behavior = 'Res_Semi_Break' if is_resist else 'Sup_Semi_Sup'
-					else:
-						behavior = 'Res_Break' if is_resist else 'Sup_Sup'
-				elif (lv - mlv) >= thres:
-					if has_mid_up:
+					elif (lv - elv) >= thres[k]:
 						behavior = 'Res_Semi_Res' if is_resist else 'Sup_Semi_Break'
-					else:
-						behavior = 'Res_Res' if is_resist else 'Sup_Break'
-				elif has_mid_up == has_mid_down:
-					end_date = get_nearest_forward_date(df, milestone_date + timedelta(days = milestone_forward))
-
-					if end_date is not None:
-						elv = df.loc[end_date]['close']
-
-						if (elv - lv) >= thres:
-							behavior = 'Res_Semi_Break' if is_resist else 'Sup_Semi_Sup'
-						elif (lv - elv) >= thres:
-							behavior = 'Res_Semi_Res' if is_resist else 'Sup_Semi_Break'
-						else:
-							behavior = 'Vibration'
 					else:
 						behavior = 'Vibration'
-				elif has_mid_up:
-					behavior = 'Res_Break' if is_resist else 'Sup_Sup'
 				else:
-					behavior = 'Res_Res' if is_resist else 'Sup_Break'
+					behavior = 'Vibration'
+			elif has_mid_up:
+				behavior = 'Res_Break' if is_resist else 'Sup_Sup'
+			else:
+				behavior = 'Res_Res' if is_resist else 'Sup_Break'
 
 		res[g[0]] = behavior
 
@@ -566,48 +626,143 @@ def get_fib_ext_behaviors(df, extensions, cur_date, merge_thres):
 
 # Generate table-format data for Fibonacci extension analysis
 def analyze_fib_extension(df, extensions, behaviors, cur_date, pivot_number, merge_thres, interval, symbol):
-	cols = ['ExtID', 'Level', 'Type', 'Width', 'Behavior', 'Description', ' ']
-	res = pd.DataFrame(columns = cols)
-	
+	res = RecordBuilder(
+		['ExtID', 'Level', 'Type', 'Width', 'Behavior', 'Description', ' '],
+		formats = {'Level': '${:.4f}', 'Width': '{:.2%}'}
+	)
 	cur_price = df.iloc[-1]['close']
-	i = 0
 
-	for g in extensions:
+	for i, g in enumerate(extensions, 1):
 		lv = (g[0][-1] + g[-1][-1]) / 2
 		b = behaviors[g[0]]
-		i += 1
 
-		record = [
+		res.append(
 			i,
-			'${:.4f}'.format(lv),
+			lv,
 			'Resistance' if lv >= cur_price else 'Support',
-			'{:.2f}%'.format(100 * (g[-1][-1] - g[0][-1]) / g[0][-1]) if len(g) > 1 else '',
+			(g[-1][-1] - g[0][-1]) / g[0][-1] if len(g) > 1 else np.nan,
 			FIB_EXT_MARKERS[b][-1] if b is not None else '',
 			' & '.join(['{:.1f}% of {:.4f}-{:.4f}'.format(FIB_EXT_LEVELS[j] * 100, zv, hv) for _, _, _, hv, zv, j, _ in g]),
 			''
-		]
-		res = pd.concat([res, pd.Series(dict(zip(cols, record))).to_frame().T], ignore_index = True)
+		)
 
-	res = pd.concat([res, pd.Series({}).to_frame().T], ignore_index = True)
-	
-	res = pd.concat([res, pd.Series({
+	res.add_footer()
+	res.add_footer({
 		'Level': 'Ticker: ' + symbol,
 		'Type': 'Current Date:',
 		'Width': change_date_format(cur_date, YMD_FORMAT, DBY_FORMAT),
 		'Behavior': 'Current Price:',
 		'Description': '${:.4f}'.format(cur_price)
-	}).to_frame().T], ignore_index = True)
-
-	res = pd.concat([res, pd.Series({
+	})
+	res.add_footer({
 		'Level': 'From: {}'.format(df.index[0].strftime(DBY_FORMAT)),
 		'Type': 'To: {}'.format(df.index[-1].strftime(DBY_FORMAT)),
 		'Width': 'By: ' + interval,
 		'Behavior': 'Merge: {:.1f}%'.format(2 * merge_thres * 100),
 		#'Description': 'Recent Pivots: {}'.format(pivot_number)
-	}).to_frame().T], ignore_index = True)
+	})
+	res.add_footer()
 
-	res = pd.concat([res, pd.Series({}).to_frame().T], ignore_index = True)
-	return res
+	return res.to_frame()
+
+# Candle sign votes of the Fibonacci extension backtest over the last 14 candles (4 for weekly and monthly data)
+# entry_signs: +1 when more than 3/5 of them rise, -1 when more than 4/5 fall, 0 otherwise (the first candles vote with those available)
+# exit_signs: +1 or -1 when more than half of them rise or fall, 0 otherwise
+def get_fib_ext_signs(df, interval):
+	signs = np.nan_to_num(np.sign(df['Close'].to_numpy() - df['Open'].to_numpy())).astype(int)
+	window = 14 if interval == INTERVAL_DAILY else 4
+
+	def get_counts(hits):
+		counts = np.cumsum(hits)
+		counts[window:] -= counts[:-window]
+		return counts
+
+	ups, downs = get_counts(signs == 1), get_counts(signs == -1)
+	votes = np.minimum(np.arange(1, len(signs) + 1), window)
+
+	entry_signs = np.where(ups > votes * 3 / 5, 1, np.where(downs > votes * 4 / 5, -1, 0))
+	exit_signs = np.where(ups > votes * 0.5, 1, np.where(downs > votes * 0.5, -1, 0))
+
+	return entry_signs, exit_signs
+
+# Whether the range of each candle contains any of the levels
+def get_level_hits(df, levels):
+	highs, lows = df['High'].to_numpy(), df['Low'].to_numpy()
+	levels = np.sort(levels)
+
+	bottoms, tops = np.where(lows < highs, lows, highs), np.where(lows > highs, lows, highs)
+	return np.searchsorted(levels, bottoms, 'left') < np.searchsorted(levels, tops, 'right')
+
+# Level hits of a walk-forward backtest, where the levels at each candle come only from the closes up to it
+# Pivots are confirmed by a TurningPointStream over the closes, so a downfall is known once the rise after its low exceeds R
+# Levels of the count most recent downfalls are recomputed only when a new one is confirmed, limited around the close then
+def get_walk_forward_level_hits(df, count, merge_thres, R = fibo_walk_forward_ratio):
+	closes = df['Close'].to_numpy()
+
+	stream = TurningPointStream(R)
+	downfalls = deque(maxlen = count)
+	high, seen_highs, seen_lows = None, 0, 0
+
+	has_level = np.zeros(len(df), dtype = bool)
+	start, levels = 0, []
+
+	for t, close in enumerate(closes.tolist()):
+		stream.push(close)
+		if len(stream.highs) == seen_highs and len(stream.lows) == seen_lows: continue
+
+		points = sorted([(i, 1) for i in stream.highs[seen_highs:]] + [(i, -1) for i in stream.lows[seen_lows:]])
+		seen_highs, seen_lows = len(stream.highs), len(stream.lows)
+		has_downfall = False
+
+		for i, sign in points:
+			if sign > 0:
+				high = i
+			elif high is not None:
+				if closes[high] - closes[i] >= closes[high] * fibo_pivot_diff_limit:
+					downfalls.append((high, i))
+					has_downfall = True
+
+				high = None
+
+		if not has_downfall: continue
+
+		has_level[start:t] = get_level_hits(df.iloc[start:t], levels)
+		hds, zds = np.array(downfalls).T
+		extensions = get_fib_extension_groups(list(downfalls), closes[hds], closes[zds], merge_thres, close * 0.05, close * 5)
+		start, levels = t, [(g[0][-1] + g[-1][-1]) / 2 for g in extensions]
+
+	has_level[start:] = get_level_hits(df.iloc[start:], levels)
+	return has_level
+
+# Transactions of the Fibonacci extension backtest as (enter, leave, position) candle positions
+# A position opens at a candle voting for a direction whose range contains a level, and closes at the first candle
+# at least MIN_FIB_EXT_TRANS_DUR days later voting for the opposite direction (leave is None for the position still open)
+def get_fib_ext_trades(dates, entry_signs, exit_signs, has_level, on_progress = None):
+	entries = np.flatnonzero((entry_signs != 0) & has_level)
+	exits = {1: np.flatnonzero(exit_signs == -1), -1: np.flatnonzero(exit_signs == 1)}
+	t = 0
+
+	while True:
+		k = np.searchsorted(entries, t)
+		if k == len(entries): break
+
+		enter = entries[k]
+		position = int(entry_signs[enter])
+
+		t = max(enter + 1, dates.searchsorted(dates[enter] + pd.Timedelta(days = MIN_FIB_EXT_TRANS_DUR)))
+		k = np.searchsorted(exits[position], t)
+
+		if k == len(exits[position]):
+			yield enter, None, position
+			break
+
+		leave = exits[position][k]
+		yield enter, leave, position
+
+		t = leave + 1
+		if on_progress is not None: on_progress(int(t), len(dates))
+
+	if on_progress is not None: on_progress(len(dates), len(dates))
 
 # Backtest using Fibonacci extension strategy
 #
@@ -620,129 +775,77 @@ def analyze_fib_extension(df, extensions, behaviors, cur_date, pivot_number, mer
 # With Short signal, either put Short position or seal ongoing Long position.
 # With Long signal, either put Long position or seal ongoing Short position.
 #
+# (Modes)
+# FIB_EXT_MODE_STATIC: levels come from the downfalls of the whole from_date..to_date range, so they look ahead
+# FIB_EXT_MODE_WALK_FORWARD: levels come from the downfalls confirmed up to each date point
+# The modes also find pivots differently (see FIB_EXT_MODE_NOTES), which the report states
+#
 # (Return)
 # Transaction records, position accuracy rate and cumulated profit on percentage basis
-def backtest_fib_extension(df, interval, pivot_number, merge_thres, symbol, from_date, to_date):
+def backtest_fib_extension(df, interval, pivot_number, merge_thres, symbol, from_date, to_date, on_progress = None, mode = FIB_EXT_MODE_STATIC):
 	#ddf, _, _ = getPointsGivenR(symbol, 1.02, startDate = from_date, endDate = to_date)
 	#D = TA.STOCHD(ddf)
  
-	cols = ['TransID', 'Position', 'EnterDate', 'EnterPrice', 'ExitDate', 'ExitPrice', 'Offset', 'Profit', 'CumProfit', 'X', ' ']
-
-	enter_date, position = None, None
-	trans_count, match_count, cum_profit = 0, 0, 0
+	res = RecordBuilder(
+		['TransID', 'Position', 'EnterDate', 'EnterPrice', 'ExitDate', 'ExitPrice', 'Offset', 'Profit', 'CumProfit', 'X', ' '],
+		formats = {
+			'EnterDate': '{:' + DBY_FORMAT + '}', 'EnterPrice': '${:.4f}', 'ExitDate': '{:' + DBY_FORMAT + '}', 'ExitPrice': '{:.4f}$',
+			'Offset': '{:.2%}', 'Profit': '{:.4%}', 'CumProfit': '{:.4%}'
+		},
+		missing = {'ExitDate': 'Stay Still'}
+	)
 
-	signs = deque(maxlen = 14 if interval == INTERVAL_DAILY else 4)
-	res = pd.DataFrame(columns = cols)
- 
 	#fcounter = 0	
-	tdf, downfalls = get_recent_downfalls_old(symbol, from_date, to_date, pivot_number) # Reduce Fibonacci pivot pairs into only recent ones
-	extensions = get_fib_extensions(tdf, downfalls, get_safe_num(merge_thres), tdf.iloc[-1]['close'] * 0.05, tdf.iloc[-1]['close'] * 5) # Merge and sort Fibonacci extension levels
-
-	for cur_date in tqdm(list(df.index), desc = 'backtesting', colour = 'red'):
-		cur_candle = df.loc[cur_date]
-
-		try:
-			signs.append(int(np.sign(cur_candle['Close'] - cur_candle['Open'])))
-			#signs.append(int(np.sign(D.loc[cur_date] - D.loc[cur_date])))
-		except Exception:
-			signs.append(0)
-
-		if enter_date is not None and (cur_date - enter_date).days < MIN_FIB_EXT_TRANS_DUR: continue
-
-		if position is None:
-		#if True:
-			if signs.count(1) > len(signs) * 3 / 5:
-				cur_sign = 1
-			elif signs.count(-1) > len(signs) * 4 / 5:
-				cur_sign = -1
-			else:
-				cur_sign = 0
-		else:
-			if signs.count(1) > len(signs) * 0.5:
-				cur_sign = 1
-			elif signs.count(-1) > len(signs) * 0.5:
-				cur_sign = -1
-			else:
-				cur_sign = 0
-			#cur_sign = np.sign(cur_candle['Close'] - cur_candle['Open'])
+	if mode == FIB_EXT_MODE_WALK_FORWARD:
+		has_level = get_walk_forward_level_hits(df, pivot_number, get_safe_num(merge_thres))
+	else:
+		tdf, downfalls = get_recent_downfalls_old(symbol, from_date, to_date, pivot_number) # Reduce Fibonacci pivot pairs into only recent ones
+		extensions = get_fib_extensions(tdf, downfalls, get_safe_num(merge_thres), tdf.iloc[-1]['close'] * 0.05, tdf.iloc[-1]['close'] * 5) # Merge and sort Fibonacci extension levels
+		has_level = get_level_hits(df, [(g[0][-1] + g[-1][-1]) / 2 for g in extensions])
 
-		if cur_sign == 0: continue
-		if position == cur_sign: continue
+	entry_signs, exit_signs = get_fib_ext_signs(df, interval)
 
-		min_cur_price = min(cur_candle['High'], cur_candle['Low'])
-		max_cur_price = max(cur_candle['High'], cur_candle['Low'])
+	closes = df['Close'].to_numpy()
+	trans_count, match_count, cum_profit = 0, 0, 0
 
-		# zdf = get_zigzag(df, cur_date)
-		# downfalls = get_recent_downfalls(zdf, pivot_number)
-  
-		# zdf = zdf.rename(columns = {"Open": "open", "High": "high", "Low": "low", "Volume": "volume", "Close": "close"})
-		# extensions = get_fib_extensions(zdf, downfalls, get_safe_num(merge_thres), cur_candle['Close'] * 2 * 0.05, cur_candle['Close'] * 2)
- 
-		if position is None:
-			has_signal = False
+	for enter, leave, position in get_fib_ext_trades(df.index, entry_signs, exit_signs, has_level, on_progress):
+		if leave is None:
+			res.append(
+				trans_count + 1,
+				'Long' if position > 0 else 'Short',
+				df.index[enter],
+				closes[enter],
+				pd.NaT, np.nan, np.nan, np.nan, np.nan, '', ' '
+			)
+			continue
 
-			for g in extensions:
-				lv = (g[0][-1] + g[-1][-1]) / 2
+		price_offset = closes[leave] - closes[enter]
+		true_sign = np.sign(price_offset)
 
-				if min_cur_price <= lv and lv <= max_cur_price:
-					has_signal = True
-					break
-		else:
-			has_signal = True
-		
-		if has_signal:
-			if position is None:
-				position = cur_sign
-				enter_date = cur_date
-			else:
-				#if position > 0:
-				if True:
-					price_offset = cur_candle['Close'] - df.loc[enter_date]['Close']
-					true_sign = np.sign(price_offset)				
-
-					if true_sign == position:
-						match_count += 1
-					# else:
-					# 	fcounter += 1
-
-					#if true_sign == position or fcounter % 4 == 1:
-					if True:
-						profit = position * price_offset / df.loc[enter_date]['Close']
-						cum_profit += profit			
-						trans_count += 1
-
-						record = [
-							trans_count,
-							'Long' if position > 0 else 'Short',
-							enter_date.strftime(DBY_FORMAT),
-							'${:.4f}'.format(df.loc[enter_date]['Close']),
-							cur_date.strftime(DBY_FORMAT),
-							'{:.4f}$'.format(cur_candle['Close']),
-							'{:.2f}%'.format(100 * price_offset / df.loc[enter_date]['Close']),
-							'{:.4f}%'.format(100 * profit),
-							'{:.4f}%'.format(100 * cum_profit),
-							'T' if true_sign == position else 'F',
-							' '
-						]
-						res = pd.concat([res, pd.Series(dict(zip(cols, record))).to_frame().T], ignore_index = True)
-
-				enter_date, position = None, None
-
-	if enter_date is not None:
-		record = [
-			trans_count + 1,
+		if true_sign == position: match_count += 1
+
+		profit = position * price_offset / closes[enter]
+		cum_profit += profit
+		trans_count += 1
+
+		res.append(
+			trans_count,
 			'Long' if position > 0 else 'Short',
-			enter_date.strftime(DBY_FORMAT),
-			'${:.4f}'.format(df.loc[enter_date]['Close']),
-			'Stay Still',
-			'', '', '', '', '', ' '
-		]
-		res = pd.concat([res, pd.Series(dict(zip(cols, record))).to_frame().T], ignore_index = True)
+			df.index[enter],
+			closes[enter],
+			df.index[leave],
+			closes[leave],
+			price_offset / closes[enter],
+			profit,
+			cum_profit,
+			'T' if true_sign == position else 'F',
+			' '
+		)
 
 	success_rate = (match_count / trans_count) if trans_count != 0 else 0
-	res = pd.concat([res, pd.Series({}).to_frame().T], ignore_index = True)
-	
-	res = pd.concat([res, pd.Series({
+
+	res.add_footer()
+	res.add_footer({
 		'TransID': 'Ticker:',
 		'Position': symbol,
 		'EnterDate': 'From: {}'.format(df.index[0].strftime(DBY_FORMAT)),
@@ -750,23 +853,30 @@ def backtest_fib_extension(df, interval, pivot_number, merge_thres, symbol, from
 		'ExitDate': 'By: ' + interval,
 		#'ExitPrice': 'Recent Pivots: {}'.format(pivot_number),
 		'ExitPrice': 'Merge: {:.1f}%'.format(2 * merge_thres * 100)
-	}).to_frame().T], ignore_index = True)
-
-	res = pd.concat([res, pd.Series({
+	})
+	res.add_footer({
+		'TransID': 'Levels:',
+		'Position': mode,
+		'EnterDate': FIB_EXT_MODE_NOTES[mode].format(fibo_walk_forward_ratio, pivot_number)
+	})
+	res.add_footer({
 		'EnterDate': 'Success Rate:',
 		'EnterPrice': '{:.1f}%'.format(success_rate * 100),
 		'ExitDate': 'Cumulative Profit:',
 		'ExitPrice': '{:.1f}%'.format(cum_profit * 100)
-	}).to_frame().T], ignore_index = True)
+	})
+	res.add_footer()
 
-	res = pd.concat([res, pd.Series({}).to_frame().T], ignore_index = True)
-	return res, success_rate, cum_profit
+	return res.to_frame(), success_rate, cum_profit
 
 # Get information for dashboard
 def get_dashboard_info():
 	#cols = ['Symbol', 'State', 'Current Price', 'New Highest']
-	cols = ['Symbol', 'Current Price', 'New Highest']
-	res = pd.DataFrame(columns = cols)
+	res = RecordBuilder(
+		['Symbol', 'Current Price', 'New Highest'],
+		formats = {'Current Price': '${:.4f}', 'New Highest': '√ ${:.4f}'},
+		missing = {'New Highest': '--------'}
+	)
 
 	for symbol in tqdm(load_stock_symbols(), desc = 'loading', colour = 'green'):
 		df = load_yf(symbol, '1800-01-01', '2100-01-01', INTERVAL_DAILY, for_backup = True)
@@ -777,35 +887,33 @@ def get_dashboard_info():
 		is_new_highest = (highs.argmax() == len(highs) - 1)
 		is_bullish = df.loc[last_date]['Close'] >= df.loc[last_date]['Open']
 
-		record = [
+		res.append(
 			symbol,
 			#'↑ Bullish' if is_bullish else '↓ Bearish',
-			'${:.4f}'.format(df.loc[last_date]['Close']),
-			'√ ${:.4f}'.format(highs[-1]) if is_new_highest else '--------'
-		]
-		res = pd.concat([res, pd.Series(dict(zip(cols, record))).to_frame().T], ignore_index = True)
+			df.loc[last_date]['Close'],
+			highs[-1] if is_new_highest else np.nan
+		)
 
-	res = pd.concat([res, pd.Series({}).to_frame().T], ignore_index = True)
-	return res, last_date
+	res.add_footer()
+	return res.to_frame(), last_date
 
-def is_pivot(candle, window, df):
-	if candle - window < 0 or candle + window >= len(df): return 0
-	
-	pivot_high = 1
-	pivot_low = 2
-	
-	for i in range(candle - window, candle + window + 1):
-		if df.iloc[candle].Low > df.iloc[i].Low: pivot_low = 0
-		if df.iloc[candle].High < df.iloc[i].High: pivot_high = 0
-	
-	if pivot_high and pivot_low:
-		return 3
-	elif pivot_high:
-		return pivot_high
-	elif pivot_low:
-		return pivot_low
-	else:
-		return 0
+# isPivot codes of all candles: 1 when its high is the highest and 2 when its low is the lowest of the 2 * window + 1 candles
+# centered on it, 3 when both, 0 otherwise and for candles closer than window to either end
+def get_pivots(highs, lows, window):
+	highs, lows = np.asarray(highs, dtype = np.float64), np.asarray(lows, dtype = np.float64)
+	n = len(highs)
+	pivots = np.zeros(n, dtype = np.int64)
+
+	if n < 2 * window + 1: return pivots
+
+	# Missing values never make a candle lose its pivot state
+	window_highs = sliding_window_view(np.where(np.isnan(highs), -np.inf, highs), 2 * window + 1).max(axis = 1)
+	window_lows = sliding_window_view(np.where(np.isnan(lows), np.inf, lows), 2 * window + 1).min(axis = 1)
+
+	candles = slice(window, n - window)
+	pivots[candles] = np.where(highs[candles] < window_highs, 0, 1) + np.where(lows[candles] > window_lows, 0, 2)
+
+	return pivots
 
 def calculate_point_pos(row):
 	if row['isPivot'] == 2:
@@ -834,7 +942,7 @@ def alert_trendline(df, symbol, cur_date, interval):
 		window = 3 * level
 		backcandles = 10 * window
 		
-		df['isPivot'] = df.apply(lambda row: is_pivot(row.name, window, df), axis = 1)
+		df['isPivot'] = get_pivots(df['High'], df['Low'], window)
 		signal = is_breakout(len(df) - 1, backcandles, window, df, stop_percentage)
   
 		if signal == 1:
@@ -847,34 +955,38 @@ def alert_trendline(df, symbol, cur_date, interval):
 				)
 	return output
 
+# Trendline trades of a single level, leaving df as it is
+def get_trendline_level_trades(df, level):
+	window = 3 * level
+	backcandles = 10 * window
+
+	df = df.assign(isPivot = get_pivots(df['High'], df['Low'], window))
+	df['isBreakOut'] = ChannelFitter(df).get_breakouts(backcandles, window)
+
+	return unit_trendline_backtest(df, level)
+
 # Backtest Trendline Program
-def backtest_trendline(df, symbol, from_date, to_date, interval):
-	combined_trades = pd.DataFrame()
-	
+def backtest_trendline(df, symbol, from_date, to_date, interval, on_progress = None):
 	df['ID'] = range(len(df))
 	df['Date'] = list(df.index)
 	df.set_index('ID', inplace = True)
- 
-	atr = ta.atr(high = df['High'], low = df['Low'], close = df['Close'], length = 14)
-	atr_multiplier = 2 
-	stop_percentage = atr.iloc[-1] * atr_multiplier / df['Close'].iloc[-1]
         
     # For a certain date point, we can only have one decision
     # So the loop of levels and arrange the results is nonsense
     # Nikola fixed it so to calculate only once
-	for level in tqdm(list(range(2, 11, 2))):
-	#for level in range(4, 5, 2):
-		window = 3 * level
-		backcandles = 10 * window
-		
-		df['isPivot'] = df.apply(lambda row: is_pivot(row.name, window, df), axis = 1)
-		df['isBreakOut'] = 0
-  
-		for i in range(backcandles + window, len(df)):
-			df.loc[i, 'isBreakOut'] = is_breakout(i, backcandles, window, df, stop_percentage)
 
-		trades_data = unit_trendline_backtest(df, level)
-		combined_trades = pd.concat([combined_trades, trades_data])
+	# Levels are independent, so they run in parallel processes when there are cores to spare
+	levels = list(range(2, 11, 2))
+	workers = min(len(levels), backtest_workers or os.cpu_count() or 1)
+
+	if workers > 1:
+		with ProcessPoolExecutor(max_workers = workers) as pool:
+			futures = [pool.submit(get_trendline_level_trades, df, level) for level in levels]
+			level_trades = [future.result() for future in track_progress(futures, on_progress)]
+	else:
+		level_trades = [get_trendline_level_trades(df, level) for level in track_progress(levels, on_progress)]
+
+	combined_trades = pd.concat(level_trades)
 
 	# Merge the transactions with the same entry dates
 	combined_trades = combined_trades.sort_values(by = 'Enter Date')
@@ -894,10 +1006,10 @@ def backtest_trendline(df, symbol, from_date, to_date, interval):
 	
 	combined_trades = combined_trades.drop('Profit/Loss', axis = 1)
 	combined_trades = combined_trades.drop('Level', axis = 1)
-	combined_trades = combined_trades.round(4)
+	combined_trades = combined_trades.round(4).reset_index(drop = True)
 
 	# Records for visualization dataframe
-	last_records = [
+	set_report_footer(combined_trades, [
 		{},
 		{
    			'Enter Price': f"Ticker: {symbol}",
@@ -912,93 +1024,159 @@ def backtest_trendline(df, symbol, from_date, to_date, interval):
    			'Signal': '{:.1f}%'.format(overall_return * 100)
 		},
 		{}
-	]
-	for r in last_records:
-		combined_trades = pd.concat([combined_trades, pd.Series(r).to_frame().T], ignore_index = True)
+	])
 
 	return combined_trades, success_rate, overall_return
 
+# Sequential sum over the last axis, adding the columns in order as numpy does for short rows
+def get_row_sums(a):
+	total = a[..., 0]
+	for j in range(1, a.shape[-1]): total = total + a[..., j]
+
+	return total
+
+# Least-squares lines through every run of m consecutive points, with the same rounding as stats.linregress
+# Returns slopes, intercepts and r values, the line through points[k:k + m] at position k
+def get_run_lines(xs, ys, m):
+	if len(xs) < m: return np.empty(0), np.empty(0), np.empty(0)
+
+	X, Y = sliding_window_view(xs, m), sliding_window_view(ys, m)
+	x_mean, y_mean = get_row_sums(X) / m, get_row_sums(Y) / m
+	dx, dy = X - x_mean[:, None], Y - y_mean[:, None]
+
+	ssxm, ssxym, ssym = get_row_sums(dx * dx) * (1 / m), get_row_sums(dx * dy) * (1 / m), get_row_sums(dy * dy) * (1 / m)
+
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		r = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+		r = np.where((ssxm == 0) | (ssym == 0), np.where(ssxym == 0, np.nan, 0.0), r)
+		slopes = ssxym / ssxm
+
+	return slopes, y_mean - slopes * x_mean, r
+
+# Trendline channels over the pivots of a frame with an isPivot column (see get_pivots)
+# Keeps the positions of the low (isPivot 2) and high (isPivot 1) pivots with the lines through every 2, 3 and 4 consecutive ones,
+# so that a channel is looked up instead of fitted
+class ChannelFitter:
+	def __init__(self, df):
+		pivots = df['isPivot'].to_numpy()
+		xs = df.index.to_numpy(dtype = np.float64)
+
+		self.n = len(df)
+		self.low, self.high = df['Low'].to_numpy(), df['High'].to_numpy()
+		self.open, self.close = df['Open'].to_numpy(), df['Close'].to_numpy()
+		self.volume = df['Volume'].to_numpy()
+
+		self.low_pivots = np.flatnonzero(pivots == 2).tolist()
+		self.high_pivots = np.flatnonzero(pivots == 1).tolist()
+		self.low_lines = {m: get_run_lines(xs[self.low_pivots], self.low[self.low_pivots], m) for m in range(2, 5)}
+		self.high_lines = {m: get_run_lines(xs[self.high_pivots], self.high[self.high_pivots], m) for m in range(2, 5)}
+
+	# Line through the last (up to 4) pivots at positions in [start, stop), as (slope, intercept, r, count)
+	def get_line(self, pivots, lines, start, stop):
+		hi = bisect.bisect_left(pivots, stop)
+		m = min(4, hi - bisect.bisect_left(pivots, start))
+		if m < 2: return None
+
+		slopes, intercepts, r = lines[m]
+		return slopes[hi - m], intercepts[hi - m], r[hi - m], m
+
+	# Same as collect_channel(candle, backcandles, window, df)
+	def collect(self, candle, backcandles, window):
+		best_r_squared_low = 0
+		best_r_squared_high = 0
+		best_slope_low = 0
+		best_intercept_low = 0
+		best_slope_high = 0
+		best_intercept_high = 0
+		best_backcandles_low = 0
+		best_backcandles_high = 0
+
+		for i in range(backcandles - backcandles // 2, backcandles + backcandles // 2, window):
+			# Bounds of df.iloc[candle - i - window:candle - window]
+			start, stop, _ = slice(candle - i - window, candle - window).indices(self.n)
+
+			line = self.get_line(self.low_pivots, self.low_lines, start, stop)
+
+			if line is not None:
+				slope_low, intercept_low, r_value_l, count = line
+
+				if (r_value_l ** 2) * count > best_r_squared_low and (r_value_l ** 2) > 0.85:
+					best_r_squared_low = (r_value_l ** 2) * count
+					best_slope_low = slope_low
+					best_intercept_low = intercept_low
+					best_backcandles_low = i
+
+			line = self.get_line(self.high_pivots, self.high_lines, start, stop)
+
+			if line is not None:
+				slope_high, intercept_high, r_value_h, count = line
+
+				if (r_value_h ** 2) * count > best_r_squared_high and (r_value_h ** 2) > 0.85:
+					best_r_squared_high = (r_value_h ** 2) * count
+					best_slope_high = slope_high
+					best_intercept_high = intercept_high
+					best_backcandles_high = i
+
+		return best_backcandles_low, best_slope_low, best_intercept_low, best_r_squared_low, best_backcandles_high, best_slope_high, best_intercept_high, best_r_squared_high
+
+	# Breakout signal of a candle (see is_breakout), given that the previous candle has none
+	def get_breakout(self, candle, backcandles, window):
+		if candle - backcandles - window < 0: return 0
+		best_back_l, sl_lows, interc_lows, r_sq_l, best_back_h, sl_highs, interc_highs, r_sq_h = self.collect(candle, backcandles, window)
+
+		thirdback = candle - 2
+		thirdback_low = self.low[thirdback]
+		thirdback_high = self.high[thirdback]
+		thirdback_volume = self.volume[thirdback]
+
+		prev_idx = candle - 1
+		prev_close = self.close[prev_idx]
+		prev_open = self.open[prev_idx]
+
+		curr_idx = candle
+		curr_close = self.close[curr_idx]
+		curr_open = self.open[curr_idx]
+		curr_volume = max(self.volume[candle], self.volume[candle - 1])
+
+		if (
+			thirdback_high > sl_lows * thirdback + interc_lows and
+			curr_volume > thirdback_volume and
+			prev_close < prev_open and
+			curr_close < curr_open and
+			sl_lows > 0 and
+			prev_close < sl_lows * prev_idx + interc_lows and
+			curr_close < sl_lows * prev_idx + interc_lows):
+			return 1
+		elif (
+			thirdback_low < sl_highs * thirdback + interc_highs and
+			curr_volume > thirdback_volume and
+			prev_close > prev_open and
+			curr_close > curr_open and
+			sl_highs < 0 and
+			prev_close > sl_highs * prev_idx + interc_highs and
+			curr_close > sl_highs * prev_idx + interc_highs):
+			return 2
+		else:
+			return 0
+
+	# isBreakOut codes of all candles from the first one with a full channel history
+	def get_breakouts(self, backcandles, window):
+		breakouts = np.zeros(self.n, dtype = np.int64)
+
+		for i in range(backcandles + window, self.n):
+			if breakouts[i - 1] == 0: breakouts[i] = self.get_breakout(i, backcandles, window)
+
+		return breakouts
+
 def collect_channel(candle, backcandles, window, df):
-	best_r_squared_low = 0
-	best_r_squared_high = 0
-	best_slope_low = 0
-	best_intercept_low = 0
-	best_slope_high = 0
-	best_intercept_high = 0
-	best_backcandles_low = 0
-	best_backcandles_high = 0
-	
-	for i in range(backcandles - backcandles // 2, backcandles + backcandles // 2, window):
-		local_df = df.iloc[candle - i - window: candle - window]
-		
-		lows = local_df[local_df['isPivot'] == 2].Low.values[-4:]
-		idx_lows = local_df[local_df['isPivot'] == 2].Low.index[-4:]
-		highs = local_df[local_df['isPivot'] == 1].High.values[-4:]
-		idx_highs = local_df[local_df['isPivot'] == 1].High.index[-4:]
-
-		if len(lows) >= 2:
-			slope_low, intercept_low, r_value_l, _, _ = stats.linregress(idx_lows, lows)
-			
-			if (r_value_l ** 2) * len(lows) > best_r_squared_low and (r_value_l ** 2) > 0.85:
-				best_r_squared_low = (r_value_l ** 2) * len(lows)
-				best_slope_low = slope_low
-				best_intercept_low = intercept_low
-				best_backcandles_low = i
-		
-		if len(highs) >= 2:
-			slope_high, intercept_high, r_value_h, _, _ = stats.linregress(idx_highs, highs)
-			
-			if (r_value_h ** 2) * len(highs) > best_r_squared_high and (r_value_h ** 2)> 0.85:
-				best_r_squared_high = (r_value_h ** 2) * len(highs)
-				best_slope_high = slope_high
-				best_intercept_high = intercept_high
-				best_backcandles_high = i
-	
-	return best_backcandles_low, best_slope_low, best_intercept_low, best_r_squared_low, best_backcandles_high, best_slope_high, best_intercept_high, best_r_squared_high
+	return ChannelFitter(df).collect(candle, backcandles, window)
 
-def is_breakout(candle, backcandles, window, df, stop_percentage):
+def is_breakout(candle, backcandles, window, df, stop_percentage, channels = None):
 	if 'isBreakOut' not in df.columns: return 0
+	if df['isBreakOut'].iloc[candle - 1] != 0: return 0
 
-	for i in range(1, 2):
-		if df['isBreakOut'].iloc[candle - i] != 0: return 0
-  
-	if candle - backcandles - window < 0: return 0
-	best_back_l, sl_lows, interc_lows, r_sq_l, best_back_h, sl_highs, interc_highs, r_sq_h = collect_channel(candle, backcandles, window, df)
-	
-	thirdback = candle - 2
-	thirdback_low = df.iloc[thirdback].Low
-	thirdback_high = df.iloc[thirdback].High
-	thirdback_volume = df.iloc[thirdback].Volume
-
-	prev_idx = candle - 1
-	prev_close = df.iloc[prev_idx].Close
-	prev_open = df.iloc[prev_idx].Open
-	
-	curr_idx = candle
-	curr_close = df.iloc[curr_idx].Close
-	curr_open = df.iloc[curr_idx].Open
-	curr_volume= max(df.iloc[candle].Volume, df.iloc[candle-1].Volume)
-
-	if ( 
-		thirdback_high > sl_lows * thirdback + interc_lows and
-		curr_volume > thirdback_volume and
-		prev_close < prev_open and
-		curr_close < curr_open and
-		sl_lows > 0 and
-		prev_close < sl_lows * prev_idx + interc_lows and
-		curr_close < sl_lows * prev_idx + interc_lows):
-		return 1
-	elif (
-		thirdback_low < sl_highs * thirdback + interc_highs and
-		curr_volume > thirdback_volume and
-		prev_close > prev_open and 
-		curr_close > curr_open and
-		sl_highs < 0 and
-		prev_close > sl_highs * prev_idx + interc_highs and
-		curr_close > sl_highs * prev_idx + interc_highs):
-		return 2
-	else:
-		return 0
+	if channels is None: channels = ChannelFitter(df)
+	return channels.get_breakout(candle, backcandles, window)
 
 def getDivergance_LL_HL(r, rS):
     divs = []
@@ -1037,51 +1215,46 @@ def calculate_breakpoint_pos(row):
 	else:
 		return np.nan
 
+# Position of the first pivot after each candle, the last candle when no pivot follows
+# Built in one reverse pass: the first pivot from a candle on is either the candle itself or the one of the next candle
+def get_next_pivots(pivots):
+    n = len(pivots)
+
+    following = np.where(np.asarray(pivots) != 0, np.arange(n), n)
+    following = np.minimum.accumulate(following[::-1])[::-1]
+    next_pivots = np.append(following[1:], n)
+
+    return np.where(next_pivots < n, next_pivots, n - 1)
+
+# Trades entered on each breakout (isBreakOut 2 long, 1 short) and exited at the next pivot
 def unit_trendline_backtest(df, level):
-    trades = []
+    cols = ['Enter Date', 'Enter Price', 'Exit Date', 'Exit Price', 'Profit/Loss', 'Signal', 'Level']
+
+    signals = df['isBreakOut'].to_numpy()
+    entries = np.flatnonzero((signals == 1) | (signals == 2))
+    entries = entries[entries >= 1]
+
+    if len(entries) == 0:
+        trade_data = pd.DataFrame([], columns = cols)
+    else:
+        exits = get_next_pivots(df['isPivot'].to_numpy())[entries]
+        dates = pd.DatetimeIndex(df['Date']).strftime(YMD_FORMAT)
+        closes = df['Close'].to_numpy()
+
+        is_long = signals[entries] == 2
+        entry_prices, exit_prices = closes[entries], closes[exits]
+
+        # Same as calculate_profit_or_stopped
+        profit_or_stopped = np.where(np.where(is_long, exit_prices >= entry_prices, exit_prices <= entry_prices), 1, -1)
+
+        trade_data = pd.DataFrame({
+            'Enter Date': dates[entries], 'Enter Price': entry_prices,
+            'Exit Date': dates[exits], 'Exit Price': exit_prices,
+            'Profit/Loss': profit_or_stopped,
+            'Signal': np.where(is_long, 'Long', 'Short').astype(object),
+            'Level': level
+        }, columns = cols)
 
-    for i in range(1, len(df)):
-        signal_type = df['isBreakOut'].iloc[i]
-        signal = ""
-        
-        if signal_type == 2:
-            signal = "Long"
-            entry_date = df['Date'].iloc[i].strftime(YMD_FORMAT)
-            entry_price = df['Close'].iloc[i]
-            exit_price = None
-
-            for j in range(i + 1, len(df)):
-                if df['isPivot'].iloc[j] != 0:
-                    exit_date = df['Date'].iloc[j].strftime(YMD_FORMAT)
-                    exit_price = df['Close'].iloc[j]
-                    break
-
-            if exit_price is None:
-                exit_date = df['Date'].iloc[-1].strftime(YMD_FORMAT)
-                exit_price = df['Close'].iloc[-1]
-
-            profit_or_stopped = calculate_profit_or_stopped(entry_price, exit_price, signal_type)
-            trades.append((entry_date, entry_price, exit_date, exit_price, profit_or_stopped,signal,level))
-        elif signal_type == 1:
-              signal = "Short"
-              entry_date = df['Date'].iloc[i].strftime(YMD_FORMAT)
-              entry_price = df['Close'].iloc[i]
-              exit_price = None
-              
-              for j in range(i + 1, len(df)):
-                if df['isPivot'].iloc[j] != 0:
-                    exit_date = df['Date'].iloc[j].strftime(YMD_FORMAT)
-                    exit_price = df['Close'].iloc[j]
-                    break
-
-              if exit_price is None:
-                    exit_date = df['Date'].iloc[-1].strftime(YMD_FORMAT)
-                    exit_price = df['Close'].iloc[-1]
-
-              profit_or_stopped = calculate_profit_or_stopped(entry_price, exit_price, signal_type)
-              trades.append((entry_date, entry_price, exit_date, exit_price, profit_or_stopped, signal, level))
-
-    trade_data = pd.DataFrame(trades, columns = ['Enter Date', 'Enter Price', 'Exit Date', 'Exit Price', 'Profit/Loss', 'Signal', 'Level'])
     trade_data['Return'] = trade_data['Profit/Loss'] * abs(trade_data['Enter Price'] - trade_data['Exit Price'] ) / trade_data['Enter Price']
 
     return trade_data
@@ -1153,54 +1326,24 @@ def getPointsBest(STOCK, min_ = 0.23, max_ = 0.8, getR = False, startDate = '200
     d = today - end_
     
     if returnData == 'close':
-        Sdata = getScaledY(data["close"])
+        series = data["close"]
     elif returnData == 'lows':
-        Sdata = getScaledY(data["low"])
+        series = data["low"]
     elif returnData == 'highs':
-        Sdata = getScaledY(data["high"])
+        series = data["high"]
     else:
         print("Wrong data for argument returnData")
         return None
     
-    R = 1.1
-    satisfied = False
-    c = 0
+    Sdata = getScaledY(series)
+    R, points = search_turning_ratio(np.ascontiguousarray(series, dtype = np.float64), Sdata, min_, max_, increment = increment, limit = limit)
     
-    while not satisfied and c < limit and R > 1:
-        if returnData == 'close':
-            highs, lows = getPointsforArray(data["close"], R)
-        elif returnData == 'lows':
-            highs, lows = getPointsforArray(data["low"], R)
-        else:
-            highs, lows = getPointsforArray(data["high"], R)
-        
-        if not len(highs) <2 and not len(lows) < 2:
-            linears = getLinears(Sdata, sorted(highs+lows))
-            MSE = getMSE(Sdata, linears)
-            c += 1
-            
-            if min_ < MSE and MSE < max_:
-                satisfied = True
-            elif MSE > min_:
-                R -= increment
-            else:
-                R += increment                
-        else:
-            R -= increment
-    if R > 1:
-        if returnData == 'close':
-            h, l = getPointsforArray(data["close"], R)
-        elif returnData == 'lows':
-            h, l = getPointsforArray(data["low"], R)
-        else:
-            h, l = getPointsforArray(data["close"], R)
+    if returnData == 'highs':
+        h, l = getPointsforArray(data["close"], R if R > 1 else 1.001)
+    elif points is not None:
+        h, l = points
     else:
-        if returnData == 'close':
-            h, l = getPointsforArray(data["close"], 1.001)
-        elif returnData == 'lows':
-            h, l = getPointsforArray(data["low"], 1.001)
-        else:
-            h, l = getPointsforArray(data["close"], 1.001)
+        h, l = getPointsforArray(series, 1.001)
 
     if getR:
         return data, h, l, R
@@ -1234,40 +1377,152 @@ def getLinearForX(lins, x):
     return None
 
 def getMSE(data, lins):
-    i = lins[0].x1
-    E = 0
+    xs = np.array([l.x1 for l in lins] + [lins[-1].x2])
+    ys = np.array([l.y1 for l in lins] + [lins[-1].y2])
     
-    while i < lins[-1].x2:
-        l = getLinearForX(lins, i)
-        p = data[getUnscaledX(i, data)]
-        pHat = l.getY(i)
-        E += abs((p - pHat)) * 1 / len(data)
-        i += 1 / len(data)
+    return get_polyline_error(data, xs, ys)
+
+# Piecewise-linear error of data against the polyline through its turning points
+# Same value as getMSE(data, getLinears(data, Tps)) without building the segments
+def get_turning_error(data, Tps):
+    Tps = np.asarray(Tps)
+    return get_polyline_error(data, getScaledX(Tps, data), data[Tps])
 
-    return E * 10
+# Error of data against the polyline through breakpoints (xs, ys), evaluated at every scaled x in one pass
+def get_polyline_error(data, xs, ys):
+    n = len(data)
+    
+    # Sample points are a running sum of 1/n steps so that they land on the same floats as stepping one by one
+    count = int((xs[-1] - xs[0]) * n) + 2
+    x = np.cumsum(np.concatenate(([xs[0]], np.full(count, 1 / n))))
+    x = x[x < xs[-1]]
+    
+    m = (ys[:-1] - ys[1:]) / (xs[:-1] - xs[1:])
+    c = ys[:-1] - m * xs[:-1]
+    seg = np.searchsorted(xs[1:], x, side = 'left')
+    
+    p = data[(x * n).astype(np.int64)]
+    pHat = m[seg] * x + c[seg]
+    
+    return np.sum(np.abs(p - pHat) * 1 / n) * 10
+
+# Search R on the grid 1.1 + k * increment for turning points of values whose error on scaled data lies within (min_, max_)
+# Follows the stepwise walk (down while too coarse or too few points, up while too fine, at most limit error evaluations)
+# but brackets and bisects each run of R values giving the same turning points, so a run costs a few evaluations instead of one per step
+# Returns the final R and its (highs, lows), or points of None when R fell to 1 or below
+def search_turning_ratio(values, scaled, min_, max_, increment = 0.005, limit = 100, R = 1.1):
+    results = {}
+    
+    # Grid points are accumulated step by step like the walk does, so that they land on the same floats
+    def get_ratio(k):
+        r = R
+        for _ in range(abs(k)): r = r + increment if k > 0 else r - increment
+        return r
+    
+    # Turning points of a grid point, the side of the band its error falls on (1 too coarse, -1 too fine) and whether the error counts
+    def evaluate(k):
+        if k not in results:
+            highs, lows = get_turning_points(values, get_ratio(k))
+            
+            if len(highs) < 2 or len(lows) < 2:
+                results[k] = (highs, lows, 1, False)
+            else:
+                error = get_turning_error(scaled, sorted(highs + lows))
+                results[k] = (highs, lows, 0 if min_ < error and error < max_ else (1 if error > min_ else -1), True)
+        
+        return results[k]
+    
+    # Last grid point from k towards bound with the same turning points as k
+    def get_run_end(k, step, bound):
+        points = evaluate(k)[:2]
+        near, far, span = k, k, 1
+        
+        while far != bound and evaluate(far)[:2] == points:
+            near = far
+            far = max(bound, far - span) if step < 0 else min(bound, far + span)
+            span *= 2
+        
+        if evaluate(far)[:2] == points: return far
+        
+        while abs(far - near) > 1:
+            mid = (near + far) // 2
+            
+            if evaluate(mid)[:2] == points:
+                near = mid
+            else:
+                far = mid
+        
+        return near
+    
+    k_min, r = 0, R
+    
+    while r - increment > 1:
+        r -= increment
+        k_min -= 1
+    
+    k, count = 0, 0
+    
+    while k >= k_min and count < limit:
+        highs, lows, side, counted = evaluate(k)
+        if side == 0: return get_ratio(k), (highs, lows)
+        
+        step = -side
+        end = get_run_end(k, step, k_min if step < 0 else k + limit - count)
+        steps = abs(end - k) + 1
+        
+        # The walk runs out of evaluations inside this run
+        if counted and count + steps >= limit:
+            k += (limit - count) * step
+            break
+        
+        if counted: count += steps
+        k = end + step
+    
+    if k < k_min: return get_ratio(k), None
+    return get_ratio(k), evaluate(k)[:2]
 
 def getPointsforArray(series, R = 1.1):
     highs, lows = getTurningPoints(series, R, combined = False)
     return highs, lows
 
 def getTurningPoints(closeSmall, R, combined = True):    
-    markers_on = []
-    highs = []
-    lows = []
-    
-    i, markers_on = findFirst(closeSmall, len(closeSmall), R, markers_on)
-    
-    if i < len(closeSmall) and closeSmall[i] > closeSmall[0]:
-        i, highs = finMax(i, closeSmall, len(closeSmall) - 1, R, highs)
-    while i < len(closeSmall) - 1 and not math.isnan(closeSmall[i]):
-        i, lows = finMin(i, closeSmall, len(closeSmall) - 1, R, lows)
-        i, highs = finMax(i, closeSmall, len(closeSmall) - 1, R, highs)
+    highs, lows = get_turning_points(np.ascontiguousarray(closeSmall, dtype = np.float64), R)
     
     if combined:
         return highs + lows
     else:
         return highs, lows
 
+# Turning points of a contiguous float array, returned as high and low index lists
+# Results are memoized by array content and R, so repeated analyses of the same prices skip the scan
+def get_turning_points(a, R):
+    key = (get_array_fingerprint(a), R)
+    points = turning_caches.get(key)
+    
+    if points is None:
+        points = tuple(np.array(p, dtype = np.int64) for p in scan_turning_points(a, R))
+        turning_caches.put(key, points)
+    
+    return points[0].tolist(), points[1].tolist()
+
+# The scalar scans run over Python floats, which index far faster than Series or NumPy scalars
+# Arrays with zeros stay NumPy to keep its division semantics (inf/nan instead of ZeroDivisionError)
+def scan_turning_points(a, R):
+    values = a.tolist() if a.all() else a
+    n = len(values)
+    highs = []
+    lows = []
+    
+    i, _ = findFirst(values, n, R, [])
+    
+    if i < n and values[i] > values[0]:
+        i, highs = finMax(i, values, n - 1, R, highs)
+    while i < n - 1 and not math.isnan(values[i]):
+        i, lows = finMin(i, values, n - 1, R, lows)
+        i, highs = finMax(i, values, n - 1, R, highs)
+    
+    return highs, lows
+
 def findFirst(a, n, R, markers_on):
     iMin = 1
     iMax = 1
@@ -1308,6 +1563,86 @@ def finMax(i, a, n, R, markers_on):
         
     return i, markers_on
 
+# Division with NumPy semantics for zero divisors (inf/nan instead of ZeroDivisionError), as the scans see it
+def get_scan_ratio(x, y):
+	if y != 0: return x / y
+
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		return np.float64(x) / y
+
+# Incremental turning point scan
+# After each push(), points() equals getPointsforArray() of all values pushed so far
+# The scan state lags one value behind, as getTurningPoints never steps onto the last value and only compares against it
+class TurningPointStream:
+	def __init__(self, R):
+		self.R = R
+		self.values = []
+		self.highs = [] # Confirmed points, never change once found
+		self.lows = []
+		self.state = 'first' # 'first' (findFirst), 'min' (finMin), 'max' (finMax) or 'done'
+		self.iMin, self.iMax = 1, 1
+
+	def push(self, v):
+		self.values.append(v)
+		if len(self.values) > 1: self.step(len(self.values) - 2)
+
+	# Feed value j to the scan, starting new scans at j for as long as they stop right away
+	def step(self, j):
+		a, R = self.values, self.R
+
+		if self.state == 'first':
+			if j < 2: return
+			if get_scan_ratio(a[j], a[self.iMin]) < R and get_scan_ratio(a[self.iMax], a[j]) < R:
+				if a[j] < a[self.iMin]: self.iMin = j
+				if a[j] > a[self.iMax]: self.iMax = j
+				return
+
+			# findFirst stops here, the first scan is finMax on a rise and finMin otherwise
+			if a[j] > a[0]:
+				self.state, self.iExt = 'max', j
+			elif math.isnan(a[j]):
+				self.state = 'done'
+				return
+			else:
+				self.state, self.iExt = 'min', j
+
+		stops = 0
+
+		while self.state != 'done':
+			if self.state == 'min':
+				if get_scan_ratio(a[j], a[self.iExt]) < R:
+					if a[j] < a[self.iExt]: self.iExt = j
+					return
+
+				self.lows.append(self.iExt)
+				self.state = 'max'
+			else:
+				if get_scan_ratio(a[self.iExt], a[j]) < R:
+					if a[j] > a[self.iExt]: self.iExt = j
+					return
+
+				self.highs.append(self.iExt)
+				self.state = 'done' if math.isnan(a[j]) else 'min'
+
+			# getTurningPoints would loop forever here (e.g. on zeros)
+			stops += 1
+			if stops > 2: raise ValueError('Turning point scan does not advance at {}'.format(j))
+
+			self.iExt = j
+
+	# Point the scan in progress would add, compared against the last value
+	def get_tail(self):
+		if self.state == 'min' and self.values[self.iExt] < self.values[-1]: return None, self.iExt
+		if self.state == 'max' and self.values[self.iExt] > self.values[-1]: return self.iExt, None
+
+		return None, None
+
+	def points(self):
+		if self.state == 'first': return [], []
+		high, low = self.get_tail()
+
+		return self.highs + ([] if high is None else [high]), self.lows + ([] if low is None else [low])
+
 def getPointsGivenR(STOCK, R, startDate = '2000-01-01', endDate = '2121-01-01', interval = INTERVAL_DAILY, type_ = None, oldData = None):
 	if oldData is None:
 		data = load_yf(STOCK, startDate, endDate, interval)
@@ -1334,6 +1669,94 @@ def getPointsGivenR(STOCK, R, startDate = '2000-01-01', endDate = '2121-01-01',
 	else:
 		return None, None
 
+# Indicator and price lines of a bullish (LL-HL) divergence, None when both slopes point the same way
+def get_bullish_divergence_lines(t, data, D):
+	sS, eS = t[0][0], t[1][0]
+	sD, eD = t[0][1], t[1][1]
+	stockS = data.iloc[t[0][0]].high
+	stockE = data.iloc[t[1][0]].high
+
+	if eS == sS or sD == eD: return None
+
+	StockM = (stockE - stockS) / (eS - sS)
+	Dm = (eD - sS) / (eD - sD)
+
+	if StockM > 0.2 and Dm > 0.2: return None
+	if StockM < -0.2 and Dm < -0.2: return None
+
+	start = max(t[0][1], t[0][0])
+	ending = min(t[1])
+
+	a1 = dict(
+		x0 = data.iloc[start].name,
+		y0 = D.iloc[start],
+		x1 = data.iloc[ending].name,
+		y1 = D.iloc[ending],
+		type = 'line',
+		xref = 'x2',
+		yref = 'y2',
+		line_width = 4,
+		line_color = 'blue'
+	)
+	b1 = dict(
+		x0 = data.iloc[start].name,
+		y0 = data.iloc[start].low,
+		x1 = data.iloc[ending].name,
+		y1 = data.iloc[ending].low,
+		type = 'line',
+		xref = 'x',
+		yref = 'y',
+		line_width = 4,
+		line_color = 'blue'
+	)
+
+	return a1, b1
+
+# Indicator and price lines of a bearish (HH-LH) divergence, None when both slopes point the same way
+def get_bearish_divergence_lines(t, data, D):
+	sS, eS = t[0][0], t[1][0]
+	sD, eD = t[0][1], t[1][1]
+	ss = max(sS, sD)
+	ee = min(eS, eD)
+	stockS = data.iloc[ss].high
+	stockE = data.iloc[ee].high
+	dds = D.iloc[ss]
+	dde = D.iloc[ee]
+
+	if eS == sS or sD == eD: return None
+
+	StockM = (stockE - stockS)/(eS-sS)
+	Dm = (dde - dds)/(eS-sS)
+
+	if StockM > 0.2 and Dm > 0.2: return None
+	if StockM < -0.2 and Dm < -0.2: return None
+
+	start = max(t[0][1], t[0][0])
+	ending = min(t[1])
+
+	a1 = dict(
+		x0 = data.iloc[start].name,
+		y0 = D.iloc[start],
+		x1 = data.iloc[ending].name,
+		y1 = D.iloc[ending],
+		type = 'line',
+		xref = 'x2',
+		yref = 'y2',
+		line_width = 4
+	)
+	a2 = dict(
+		x0 = data.iloc[start].name,
+		y0 = data.iloc[start].high,
+		x1 = data.iloc[ending].name,
+		y1 = data.iloc[ending].high,
+		type = 'line',
+		xref = 'x',
+		yref = 'y',
+		line_width = 4
+	)
+
+	return a1, a2
+
 def runStochDivergance(symbol, from_date = '2000-01-01', to_date = '2022-08-07', return_csv = False, cur_date = None, old_data = None):
 	R = 1.02
 	data, _, _ = getPointsGivenR(symbol, R, startDate = from_date, endDate = to_date, oldData = old_data)
@@ -1384,115 +1807,21 @@ def runStochDivergance(symbol, from_date = '2000-01-01', to_date = '2022-08-07',
 		fig.add_trace(go.Scatter(x = df.index, y = df['close'].rolling(10).mean(), name = 'MA-10W'))
 		fig.add_trace(go.Scatter(x = df.index, y = df['close'].rolling(40).mean(), name = 'MA-40W'))
 
-	lines_to_draw, typeONEs = [], []
+	lines_to_draw, typeONEs, typeTWOs = [], [], []
 
 	for t in type1:
-		sS, eS = t[0][0], t[1][0]
-		sD, eD = t[0][1], t[1][1]
-		stockS = data.iloc[t[0][0]].high
-		stockE = data.iloc[t[1][0]].high
-
-		if not eS == sS and not sD == eD:
-			StockM = (stockE - stockS) / (eS - sS)
-			Dm = (eD - sS) / (eD - sD)
-
-			if StockM > 0.2 and Dm > 0.2:
-				pass
-			elif StockM < -0.2 and Dm < -0.2:
-				pass
-			else:
-				start = max(t[0][1], t[0][0])
-				ending = min(t[1])
-				stockStart = start
-				stockEnd = ending
+		lines = get_bullish_divergence_lines(t, data, D)
+		if lines is None: continue
 
-				dStart = start
-				dEnd = ending
-				
-				if True:#data.iloc[stockStart].low > data.iloc[stockEnd].low: # Nikola Added
-					a1 = dict(
-						x0 = data.iloc[dStart].name,
-						y0 = D.iloc[dStart],
-						x1 = data.iloc[dEnd].name,
-						y1 = D.iloc[dEnd],
-						type = 'line',
-						xref = 'x2',
-						yref = 'y2',
-						line_width = 4,
-						line_color = 'blue'
-					)
-					b1 = dict(
-						x0 = data.iloc[stockStart].name,
-						y0 = data.iloc[stockStart].low,
-						x1 = data.iloc[stockEnd].name,
-						y1 = data.iloc[stockEnd].low,
-						type = 'line',
-						xref = 'x',
-						yref = 'y',
-						line_width = 4,
-						line_color = 'blue'
-					)
-					typeONEs.append((a1, b1))
-					
-					if not return_csv:
-						lines_to_draw.append(a1)
-						lines_to_draw.append(b1)                
-
-	typeTWOs = []
+		typeONEs.append(lines)
+		if not return_csv: lines_to_draw.extend(lines)
 
 	for t in type2:
-		sS, eS = t[0][0], t[1][0]
-		sD, eD = t[0][1], t[1][1]
-		ss = max(sS, sD)
-		ee = min(eS, eD)
-		stockS = data.iloc[ss].high
-		stockE = data.iloc[ee].high
-		dds = D.iloc[ss]
-		dde = D.iloc[ee]
-
-		if not eS == sS and not sD == eD:
-			StockM = (stockE - stockS)/(eS-sS)
-			Dm = (dde - dds)/(eS-sS)
-
-			if StockM > 0.2 and Dm > 0.2:
-				pass
-			elif StockM < -0.2 and Dm < -0.2:
-				pass
-			else:
-				start = max(t[0][1], t[0][0])
-				ending = min(t[1])
-				stockStart = start
-				stockEnd = ending
-
-				dStart = start
-				dEnd = ending
-
-				if True:#data.iloc[stockStart].high < data.iloc[stockEnd].high: # Nikola Added
-					a1 = dict(
-						x0 = data.iloc[dStart].name,
-						y0 = D.iloc[dStart],
-						x1 = data.iloc[dEnd].name,
-						y1 = D.iloc[dEnd],
-						type = 'line',
-						xref = 'x2',
-						yref = 'y2',
-						line_width = 4
-					)
-					a2 = dict(
-						x0 = data.iloc[stockStart].name,
-						y0 = data.iloc[stockStart].high,
-						x1 = data.iloc[stockEnd].name,
-						y1 = data.iloc[stockEnd].high,
-						type = 'line',
-						xref = 'x',
-						yref = 'y',
-						line_width = 4
-					)
-					typeTWOs.append((a1, a2))
-					
-					if not return_csv:
-						lines_to_draw.append(a1)
-						lines_to_draw.append(a2)
+		lines = get_bearish_divergence_lines(t, data, D)
+		if lines is None: continue
+
+		typeTWOs.append(lines)
+		if not return_csv: lines_to_draw.extend(lines)
 
 	if not return_csv:
 		if cur_date is not None: lines_to_draw = [d for d in lines_to_draw if d['x1'] < cur_date]
@@ -1730,67 +2059,272 @@ def plotter1(pairs, xx, yy, xScaler, yScaler, intervalSET, data, y):
 
 	return figures
 
-def get_divergence_data(stock_symbol, stdate, endate, oldData):
+# Merged regions (as getFinalReigons(getReigons(points, values)) gives) of a growing point list
+# Confirmed points only ever get appended, so all merged regions but the last one are final (stable)
+class ReigonStream:
+	def __init__(self, values, offset = 0):
+		self.values = values
+		self.offset = offset # Points are shifted by -offset and dropped when negative
+		self.count = 0
+		self.points = []
+		self.stable = []
+		self.starts, self.ends = [], [] # Bounds of the stable regions for bisection
+		self.run = None # Last merged region, still extended by same-class regions
+
+	# Values are bound again by the owner after unpickling
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['values']
+
+		return state
+
+	def add(self, p):
+		if len(self.points) > 0:
+			q = self.points[-1]
+			r = Reigon(q, p, getReigonClass(self.values[q], self.values[p]))
+
+			if self.run is None:
+				self.run = r
+			elif self.run.class_ == r.class_:
+				self.run.end = p
+			else:
+				self.stable.append(self.run)
+				self.starts.append(self.run.start)
+				self.ends.append(self.run.end)
+				self.run = r
+
+		self.points.append(p)
+
+	# Take new confirmed points from the unshifted point list
+	def update(self, points):
+		for p in points[self.count:]:
+			if p >= self.offset: self.add(p - self.offset)
+
+		self.count = len(points)
+
+	# Regions after the stable ones, given the provisional points that follow the confirmed ones
+	def get_unstable(self, tail):
+		last = None if self.run is None else Reigon(self.run.start, self.run.end, self.run.class_)
+		unstable = []
+		q = self.points[-1] if len(self.points) > 0 else None
+
+		for p in tail:
+			if q is not None:
+				r = Reigon(q, p, getReigonClass(self.values[q], self.values[p]))
+
+				if last is not None and last.class_ == r.class_:
+					last.end = p
+				else:
+					if last is not None: unstable.append(last)
+					last = r
+
+			q = p
+
+		if last is not None: unstable.append(last)
+		return unstable
+
+# Incremental stochastic divergence detector over the bars of a frame with lowercase OHLC columns
+# update(n) ingests bars one at a time up to the first n and returns the bullish (LL-HL) and bearish (HH-LH)
+# divergences found by runStochDivergance(..., return_csv = True) on the first n bars that no earlier update() returned,
+# as (startDate, endDate, DvalueStart, DvalueEnd, stockValueStart, stockValueEnd) tuples in the order it lists them
+class StochDivergenceStream:
+	offset = 15 # Leading bars runStochDivergance drops (STOCHD warm-up)
+
+	frame_keys = ('df', 'data', 'D', 'stoch_values', 'lows', 'highs')
+
+	def __init__(self, df):
+		self.length = 0
+
+		self.low_points = TurningPointStream(1.02)
+		self.high_points = TurningPointStream(1.02)
+		self.stoch_points = TurningPointStream(1.05)
+
+		self.low_reigons = ReigonStream(None, self.offset)
+		self.high_reigons = ReigonStream(None, self.offset)
+		self.stoch_low_reigons = ReigonStream(None)
+		self.stoch_high_reigons = ReigonStream(None)
+
+		self.checked = {} # Number of stable regions of each stream already paired
+		self.pairs = set()
+		self.seen = set()
+
+		self.attach(df)
+
+	# Bind the frame the bars are read from
+	# A stream can move on to a longer frame as long as its first self.length bars are unchanged
+	def attach(self, df):
+		self.df = df
+
+		# %D of a bar only depends on earlier bars, so every prefix sees these same values
+		D = TA.STOCHD(df)
+		self.stoch_values = D.to_numpy(dtype = np.float64)
+		self.data, self.D = df[self.offset:], D[self.offset:]
+
+		self.lows = df['low'].to_numpy(dtype = np.float64)
+		self.highs = df['high'].to_numpy(dtype = np.float64)
+
+		self.low_reigons.values = self.lows[self.offset:]
+		self.high_reigons.values = self.highs[self.offset:]
+		self.stoch_low_reigons.values = self.stoch_values[self.offset:]
+		self.stoch_high_reigons.values = self.stoch_values[self.offset:]
+
+	# Only the scan state gets pickled, attach() binds a frame again
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		for key in self.frame_keys: del state[key]
+
+		return state
+
+	def push(self):
+		i = self.length
+
+		self.low_points.push(self.lows[i])
+		self.high_points.push(self.highs[i])
+		if i >= self.offset: self.stoch_points.push(self.stoch_values[i])
+
+		self.length += 1
+
+	# Overlapping region pairs not paired in an earlier call, in runStochDivergance loop order
+	def get_new_pairs(self, reigons, stoch_reigons, unstable, stoch_unstable):
+		full = reigons.stable + unstable
+		stoch_full = stoch_reigons.stable + stoch_unstable
+		stoch_starts = stoch_reigons.starts + [r.start for r in stoch_unstable]
+		stoch_ends = stoch_reigons.ends + [r.end for r in stoch_unstable]
+
+		checked, stoch_checked = self.checked.get(reigons, 0), self.checked.get(stoch_reigons, 0)
+		self.checked[reigons], self.checked[stoch_reigons] = len(reigons.stable), len(stoch_reigons.stable)
+
+		pairs = []
+
+		for k, rr in enumerate(full):
+			# Only regions in this range can overlap rr
+			lo = bisect.bisect_right(stoch_ends, rr.start)
+			hi = bisect.bisect_left(stoch_starts, rr.end)
+
+			# Stable regions paired in an earlier call only need the new stable and the unstable stochastic regions
+			if k < checked: lo = max(lo, stoch_checked)
+
+			for rrs in stoch_full[lo:hi]:
+				key = (rr.start, rr.end, rr.class_, rrs.start, rrs.end, rrs.class_)
+
+				if key not in self.pairs:
+					self.pairs.add(key)
+					pairs.append((rr, rrs))
+
+		return sorted(pairs, key = lambda p: (p[0].start, p[1].start))
+
+	# Divergence tuples of region pairs (in runStochDivergance order) not returned before
+	def get_new_divergences(self, pairs, get_divergances, get_lines):
+		res = []
+
+		for rr, rrs in pairs:
+			for t in get_divergances([rr], [rrs]):
+				lines = get_lines(t, self.data, self.D)
+				if lines is None: continue
+
+				indicator, stock = lines
+				tup = (stock['x0'], stock['x1'], indicator['y0'], indicator['y1'], stock['y0'], stock['y1'])
+
+				if tup not in self.seen:
+					self.seen.add(tup)
+					res.append(tup)
+
+		return res
+
+	def update(self, n):
+		while self.length < n: self.push()
+
+		self.low_reigons.update(self.low_points.lows)
+		self.high_reigons.update(self.high_points.highs)
+		self.stoch_low_reigons.update(self.stoch_points.lows)
+		self.stoch_high_reigons.update(self.stoch_points.highs)
+
+		high_tail, low_tail = self.high_points.get_tail()[0], self.low_points.get_tail()[1]
+		stoch_high_tail, stoch_low_tail = self.stoch_points.get_tail()
+
+		get_tail = lambda p, offset: [] if p is None or p < offset else [p - offset]
+
+		pairs = self.get_new_pairs(self.low_reigons, self.stoch_low_reigons,
+			self.low_reigons.get_unstable(get_tail(low_tail, self.offset)), self.stoch_low_reigons.get_unstable(get_tail(stoch_low_tail, 0)))
+		type1 = self.get_new_divergences(pairs, getDivergance_LL_HL, get_bullish_divergence_lines)
+
+		# The last %D bar always closes the stochastic highs
+		pairs = self.get_new_pairs(self.high_reigons, self.stoch_high_reigons,
+			self.high_reigons.get_unstable(get_tail(high_tail, self.offset)), self.stoch_high_reigons.get_unstable(get_tail(stoch_high_tail, 0) + [self.length - self.offset - 1]))
+		type2 = self.get_new_divergences(pairs, getDivergance_HH_LH, get_bearish_divergence_lines)
+
+		return type1, type2
+
+# Fingerprint of the dates and OHLC values of the first n bars of a frame
+def get_bars_fingerprint(df, n):
+	values = df[['open', 'high', 'low', 'close']].to_numpy(dtype = np.float64)[:n]
+	return get_array_fingerprint(df.index.values[:n].view('<i8')) + get_array_fingerprint(values)
+
+# Checkpoint of a get_divergence_data() scan: the detector, the divergences found so far and the last day scanned
+# None if there is none, or if the bars it has seen differ from the leading bars of df
+def load_divergence_checkpoint(path, df):
+	if not os.path.exists(path): return None
+
+	try:
+		with open(path, 'rb') as fp:
+			checkpoint = pickle.load(fp)
+	except Exception as e:
+		print('Ignoring unreadable divergence checkpoint {}: {}'.format(path, e))
+		return None
+
+	n = checkpoint['stream'].length
+	if n > len(df) or checkpoint['fingerprint'] != get_bars_fingerprint(df, n): return None
+
+	checkpoint['stream'].attach(df)
+	return checkpoint
+
+# The file is replaced atomically so that an interrupted write leaves the previous checkpoint in place
+def save_divergence_checkpoint(path, checkpoint):
+	checkpoint['fingerprint'] = get_bars_fingerprint(checkpoint['stream'].df, checkpoint['stream'].length)
+	tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+	with open(tmp_path, 'wb') as fp:
+		pickle.dump(checkpoint, fp, protocol = pickle.HIGHEST_PROTOCOL)
+
+	os.replace(tmp_path, path)
+
+def get_divergence_data(stock_symbol, stdate, endate, oldData, path_format = DIVERGENCE_CHECKPOINT_PATH, on_progress = None):
         year, month, day = map(int, stdate.split('-'))
         sdate = date(year, month, day)
         
         year1, month1, day1 = map(int, endate.split('-'))
         edate = date(year1, month1, day1 )
-    
-        COMMON_START_DATE = sdate
-        STOCK = stock_symbol
 
         days = pd.date_range(sdate, edate, freq = 'd').strftime('%Y-%m-%d').tolist()
-        TT1s, TT2s = [], []
 
-        for dd in tqdm(days):
-            # Calculate divergence and get transactions
-            type1, type2, df = runStochDivergance(STOCK, COMMON_START_DATE, dd, True, old_data = oldData[:dd])
-            t1s = []
-            
-            for t in type1:
-                stockPart = t[1]
-                indicatorPart = t[0]
-                startDate = stockPart['x0']
-                endDate = stockPart['x1']
-                DvalueStart = indicatorPart['y0']
-                DvalueEnd = indicatorPart['y1']
-                stockValueStart = stockPart['y0']
-                stockValueEnd = stockPart['y1']
-                t1s.append((startDate, endDate, DvalueStart, DvalueEnd, stockValueStart, stockValueEnd, dd))
-            
-            t2s = []
-            
-            for t in type2:
-                stockPart = t[1]
-                indicatorPart = t[0]
-                startDate = stockPart['x0']
-                endDate = stockPart['x1']
-                DvalueStart = indicatorPart['y0']
-                DvalueEnd = indicatorPart['y1']
-                stockValueStart = stockPart['y0']
-                stockValueEnd = stockPart['y1']
-                t2s.append((startDate, endDate, DvalueStart, DvalueEnd, stockValueStart, stockValueEnd, dd))
-            
-            TT1s.append(t1s)
-            TT2s.append(t2s)
+        # Divergences of each day's history (bars up to that day), kept with the first day they show up
+        # The scan resumes from the checkpoint of an earlier run over the same symbol and start date
+        path = path_format.format(stock_symbol, stdate)
+        checkpoint = load_divergence_checkpoint(path, oldData)
+
+        if checkpoint is None:
+            checkpoint = {'stream': StochDivergenceStream(oldData), 'last_day': None, 'out1': [], 'out2': []}
+        elif checkpoint['last_day'] is not None:
+            days = [dd for dd in days if dd > checkpoint['last_day']]
 
-        def find_unique_smallest_date(arrays_of_tuples):
-            unique_tuples = defaultdict(list)
+        stream = checkpoint['stream']
+        ends = oldData.index.searchsorted(pd.DatetimeIndex(days) + timedelta(days = 1))
 
-            for arr in arrays_of_tuples:
-                for tup in arr:
-                    key = tuple(tup[:-1])
-                    date_str = tup[-1]
+        for i, (dd, end) in enumerate(track_progress(zip(days, ends), on_progress)):
+            type1, type2 = stream.update(end)
 
-                    if key not in unique_tuples or date_str < unique_tuples[key][-1][-1]:
-                        unique_tuples[key] = [(tup, date_str)]
+            checkpoint['out1'].extend(t + (dd,) for t in type1)
+            checkpoint['out2'].extend(t + (dd,) for t in type2)
+            checkpoint['last_day'] = dd
 
-            result = [min(tups, key = lambda x: x[-1]) for tups in unique_tuples.values()]
-            return result
+            if (i + 1) % divergence_checkpoint_days == 0 or i == len(days) - 1: save_divergence_checkpoint(path, checkpoint)
+
+        # Divergences are kept with the first day they show up, so a shorter range is a prefix of a longer one
+        out1 = [t for t in checkpoint['out1'] if t[-1] <= endate]
+        out2 = [t for t in checkpoint['out2'] if t[-1] <= endate]
 
         def rearrange(od):
-            od = [list(t[0]) for t in od]
+            od = [list(t) for t in od]
             od.sort(key = lambda x : x[0])
             
             recs = []
@@ -1838,9 +2372,6 @@ def get_divergence_data(stock_symbol, stdate, endate, oldData):
             
             return new_recs
 
-        out1 = find_unique_smallest_date(TT1s)
-        out2 = find_unique_smallest_date(TT2s)
-        
         out1 = rearrange(out1)
         out2 = rearrange(out2)
         
@@ -1,5 +1,16 @@
 
 yf_on = True
+yf_cache_budget_mb = 512
+yf_batch_size = 20
+yf_workers = 4 # Download threads of a batched fetch
+yf_batch_start_days = 7 # Symbols share a fetch only when their refresh dates are this close
+
+turning_cache_budget_mb = 64
+result_cache_budget_mb = 256 # Total size of the persisted analysis results
+
+divergence_checkpoint_days = 30
+
+backtest_workers = 0 # Processes for backtest sweeps, 0 for one per core
 
 zigzag_window = 110
 zigzag_padding = 10
@@ -10,3 +21,4 @@ zigzag_merge_dur_limit = 1080
 default_fibo_ext_merge_thres = 8
 
 fibo_pivot_diff_limit = 0.09
+fibo_walk_forward_ratio = 1.1 # Reversal ratio confirming pivots of walk-forward backtests
@@ -6,12 +6,28 @@ ALERT_COLOR_ERROR = '#D35151'
 INTERVAL_ALL = ['Daily', 'Weekly', 'Monthly', 'Quarterly', 'Yearly']
 INTERVAL_DAILY, INTERVAL_WEEKLY, INTERVAL_MONTHLY, INTERVAL_QUARTERLY, INTERVAL_YEARLY = tuple(INTERVAL_ALL)
 INTERVAL_LETTER_DICT = dict(zip(INTERVAL_ALL, ['D', 'W', 'M', 'Q', 'Y']))
+INTERVAL_AGG_DICT = {
+	'Open': 'first',
+	'Close': 'last',
+	'High': 'max',
+	'Low': 'min',
+	'Volume': 'sum'
+}
 
 PIVOT_NUMBER_ALL = [
 	'Recent One Pivot', 'Recent Two Pivots', 'Recent Three Pivots', 'Recent Four Pivots'
 ]
 PIVOT_NUMBER_ONE, PIVOT_NUMBER_TWO, PIVOT_NUMBER_THREE, PIVOT_NUMBER_FOUR = tuple(PIVOT_NUMBER_ALL)
 
+FIB_EXT_MODE_ALL = ['Static Levels', 'Walk-Forward']
+FIB_EXT_MODE_STATIC, FIB_EXT_MODE_WALK_FORWARD = tuple(FIB_EXT_MODE_ALL)
+# How each level mode finds its pivots, formatted with the walk-forward turning point ratio and the number of downfalls
+# The modes differ in the pivot detector as well as in lookahead, so their results are not comparable for lookahead alone
+FIB_EXT_MODE_NOTES = {
+	FIB_EXT_MODE_STATIC: 'Pivots of the whole range at the turning point ratio best fitting it (looks ahead), all of its downfalls',
+	FIB_EXT_MODE_WALK_FORWARD: 'Pivots confirmed so far at the fixed turning point ratio {:.2f}, the latest {} downfalls only'
+}
+
 YMD_FORMAT = '%Y-%m-%d'
 DBY_FORMAT = '%d %b %Y'
 
@@ -37,3 +53,12 @@ PLOT_COLORS_DARK = ['blue', 'brown', 'indigo', 'magenta', 'green', 'red', 'black
 NEW_HIGH_DAY_MARGIN = 60
 
 DIVERGENCE_RECORDS_PATH = 'out/DIVERGENCE_RECORDS.csv'
+DASHBOARD_SNAPSHOT_PATH = 'out/DASHBOARD_SNAPSHOT.json'
+
+PRICE_STORE_PATH = './cache/{}.col'
+PRICE_VIEW_PATH = './cache/{}@{}.col'
+DIVERGENCE_CHECKPOINT_PATH = './cache/{}@divergence_{}.pkl'
+JOB_CACHE_PATH = './cache/jobs'
+RESULT_CACHE_PATH = './cache/results/{}_{}@{}.pkl'
+PRICE_STORE_MAGIC = b'CMCOL001'
+PRICE_STORE_COLUMNS = [('Open', '<f8'), ('High', '<f8'), ('Low', '<f8'), ('Close', '<f8'), ('Volume', '<i8')]
@@ -1,5 +1,10 @@
 
+from datetime import datetime
+from constant import *
+from report import *
 import pandas as pd
+import json
+import os
 
 def initialize_data():
 	global df_stake
@@ -18,3 +23,22 @@ def load_symbols():
 
 def load_stock_symbols():
 	return [s for s in load_symbols() if not s.startswith('^')]
+
+# Persist dashboard table to be shown on the next startup, as rendered
+def save_dashboard_snapshot(info, last_date):
+	info = get_display_frame(info)
+
+	with open(DASHBOARD_SNAPSHOT_PATH, 'w') as fp:
+		json.dump({
+			'last_date': last_date.strftime(YMD_FORMAT),
+			'columns': list(info.columns),
+			'records': info.astype(object).where(info.notna(), None).values.tolist()
+		}, fp)
+
+def load_dashboard_snapshot():
+	if not os.path.exists(DASHBOARD_SNAPSHOT_PATH): return None, None
+
+	with open(DASHBOARD_SNAPSHOT_PATH) as fp:
+		snapshot = json.load(fp)
+
+	return pd.DataFrame(snapshot['records'], columns = snapshot['columns']), datetime.strptime(snapshot['last_date'], YMD_FORMAT)
@@ -0,0 +1,125 @@
+
+from concurrent.futures import Future
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+import threading
+import hashlib
+import sys
+
+# Approximate in-memory size of a cached value
+def get_nbytes(value):
+	if isinstance(value, (pd.DataFrame, pd.Series)):
+		return int(np.sum(value.memory_usage(index = True)))
+	elif isinstance(value, np.ndarray):
+		return value.nbytes
+	elif isinstance(value, (tuple, list)):
+		return sys.getsizeof(value) + sum(get_nbytes(v) for v in value)
+
+	return sys.getsizeof(value)
+
+# Content fingerprint of an array, equal for arrays with the same dtype, shape and values
+def get_array_fingerprint(a):
+	a = np.ascontiguousarray(a)
+	digest = hashlib.blake2b(a.data, digest_size = 16)
+	digest.update('{}{}'.format(a.dtype.str, a.shape).encode())
+
+	return digest.hexdigest()
+
+# Least-recently-used cache bounded by the total byte size of its entries (thread-safe)
+class LRUCache:
+	def __init__(self, budget, sizeof = get_nbytes):
+		self.budget = budget
+		self.sizeof = sizeof
+		self.entries = OrderedDict()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.lock = threading.RLock()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	# Return the cached value (None if absent) and mark it as recently used
+	def get(self, key):
+		with self.lock:
+			if key not in self.entries:
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self.entries.move_to_end(key)
+
+			return self.entries[key][0]
+
+	# Store a value, evicting least recently used entries until it fits the budget
+	# Values larger than the whole budget are not cached
+	def put(self, key, value):
+		size = self.sizeof(value)
+
+		with self.lock:
+			self.pop(key)
+			if size > self.budget: return
+
+			while self.nbytes + size > self.budget:
+				_, (_, old_size) = self.entries.popitem(last = False)
+				self.nbytes -= old_size
+				self.evictions += 1
+
+			self.entries[key] = (value, size)
+			self.nbytes += size
+
+	def pop(self, key):
+		with self.lock:
+			if key not in self.entries: return None
+
+			value, size = self.entries.pop(key)
+			self.nbytes -= size
+
+			return value
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.nbytes = 0
+
+	def stats(self):
+		with self.lock:
+			return {
+				'entries': len(self.entries),
+				'nbytes': self.nbytes,
+				'budget': self.budget,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions
+			}
+
+# Coalesce concurrent calls sharing a key
+# The first caller runs the function, callers arriving meanwhile wait for it and share its result (or exception)
+class SingleFlight:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.calls = {}
+
+	def do(self, key, fn, *args):
+		with self.lock:
+			future = self.calls.get(key)
+			is_leader = future is None
+
+			if is_leader: future = self.calls[key] = Future()
+
+		if not is_leader: return future.result()
+
+		try:
+			future.set_result(fn(*args))
+		except Exception as e:
+			future.set_exception(e)
+		finally:
+			with self.lock:
+				del self.calls[key]
+
+		return future.result()
@@ -60,7 +60,7 @@ def on_analyze_clicked(n_clicks, symbol, from_date, to_date, interval, period):
 	if period is None: return alert_error('Invalid period. Please input a number and retry.', none_ret)
 	
 	stock_data = load_yf(symbol, from_date, to_date, interval, fit_today = True)
-	stock_data.ta.bbands(length = int(period), append = True)
+	stock_data = stock_data.join(ta.bbands(stock_data['Close'], length = int(period)))
 
 	fig = go.Figure(data = [
 		get_candlestick(stock_data),
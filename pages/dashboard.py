@@ -1,4 +1,3 @@
-
 from dash import dcc, html, callback, Output, Input, State
 from constant import *
 from compute import *
@@ -10,20 +9,60 @@ from data import *
 from ui import *
 import plotly.graph_objects as go
 import numpy as np
+import threading
 import dash
 
 dash.register_page(__name__, path = '/', name = 'Dashboard', order = '00')
 
-info, last_date = get_dashboard_info()
-report = get_dashboard_content(info, last_date)
-
-layout = get_page_layout('Dashboard', html.Div(), html.Div(),
-	html.Div(
-		children = [report],
-		style = {
-			'paddingTop': '100px',
-			'text-align': 'center'
-		},
-		id = 'dash-info'
+# Dashboard table currently shown: (info, last_date, is_fresh)
+# Starts from the snapshot persisted by the previous run and is replaced once the background update finishes
+dashboard_state = load_dashboard_snapshot() + (False,)
+
+# Compute up-to-date dashboard information without blocking server startup
+def update_dashboard_info():
+	global dashboard_state
+
+	try:
+		info, last_date = get_dashboard_info()
+		save_dashboard_snapshot(info, last_date)
+	except Exception as e:
+		print('Dashboard update failed:', e)
+		info, last_date = dashboard_state[:2]
+
+	dashboard_state = (info, last_date, True)
+
+threading.Thread(target = update_dashboard_info, daemon = True).start()
+
+def get_dashboard_report():
+	info, last_date, _ = dashboard_state
+
+	if info is None: return html.H2('Loading the latest market data...')
+	return get_dashboard_content(info, last_date)
+
+def layout():
+	return get_page_layout('Dashboard', html.Div(), html.Div(),
+		html.Div([
+			html.Div(
+				children = [get_dashboard_report()],
+				style = {
+					'paddingTop': '100px',
+					'text-align': 'center'
+				},
+				id = 'dash-info'
+			),
+			dcc.Interval(id = 'dash-interval', interval = 3000, disabled = dashboard_state[-1])
+		])
 	)
+
+# Triggered periodically until the background update finishes
+@callback(
+	[
+		Output('dash-info', 'children'),
+		Output('dash-interval', 'disabled')
+	],
+	Input('dash-interval', 'n_intervals'),
+	prevent_initial_call = True
 )
+def on_interval(n_intervals):
+	if not dashboard_state[-1]: return [dash.no_update, False]
+	return [[get_dashboard_report()], True]
@@ -4,11 +4,11 @@ from datetime import date, datetime, timedelta
 from plotly.subplots import make_subplots
 from collections import defaultdict
 from constant import *
-from tqdm import tqdm
 from compute import *
 from config import *
 from yahoo import *
 from plot import *
+from results import *
 from util import *
 from data import *
 from ui import *
@@ -24,6 +24,7 @@ scenario_div = get_scenario_div([
 	get_symbol_input(),
 	get_date_range(from_date = get_offset_date_str(get_today_str(), -365)),
     get_run_button('diver'),
+    get_job_progress('diver'),
 ])
 # parameter_div = get_parameter_div([
 #     get_run_button('diver'),
@@ -54,9 +55,10 @@ layout = get_page_layout('Stochastic|Divergence', scenario_div, None, out_tab)
 		State('to-date-input', 'date'),
         #State('cur-date-input', 'date')
 	],
+	**get_job_callback_args('diver', 'diver-run-button'),
 	prevent_initial_call = True
 )
-def on_run_clicked(n_clicks, symbol, from_date, to_date):
+def on_run_clicked(set_progress, n_clicks, symbol, from_date, to_date):
     none_ret = ['Plot', None, None] # Padding return values
 
     if n_clicks == 0: return alert_hide(none_ret)
@@ -78,7 +80,10 @@ def on_run_clicked(n_clicks, symbol, from_date, to_date):
     D = TA.STOCHD(df)
 
     from_date = get_nearest_forward_date(df, get_timestamp(from_date)).strftime(YMD_FORMAT)
-    out1, out2 = get_divergence_data(symbol, from_date, to_date, oldData = df)
+    out1, out2 = get_cached_result(
+        lambda: get_divergence_data(symbol, from_date, to_date, oldData = df, on_progress = get_job_progress_reporter(set_progress)),
+        'get_divergence_data', (symbol, from_date, to_date), df.index[-1]
+    )
     
     fig = make_subplots(rows = 2, cols = 1, shared_xaxes = True, vertical_spacing = 0.01, subplot_titles = ('Stock prices', 'Stochastic Indicator'), row_width = [0.29,0.7])
     fig.update_yaxes(type = 'log', row = 1, col = 1)
@@ -7,6 +7,7 @@ from compute import *
 from config import *
 from yahoo import *
 from plot import *
+from results import *
 from util import *
 from data import *
 from ui import *
@@ -27,8 +28,10 @@ parameter_div = get_parameter_div([
 	#get_cur_date_picker(),
 	#get_pivot_number_input(),
 	get_merge_thres_input(),
+	get_fib_ext_mode_input(),
 	get_analyze_button('fib-ext'),
-	get_backtest_button('fib-ext')
+	get_backtest_button('fib-ext'),
+	get_job_progress('fib-ext')
 ])
 out_tab = get_out_tab({
 	'Plot': get_plot_div(),
@@ -110,7 +113,7 @@ def on_analyze_clicked(n_clicks, symbol, from_date, to_date, merge_thres):
 	csv_path = 'out/FIB-EXT-ANALYZE_{}_{}_{}_{}_{}_p{}_m{}%.csv'.format(
 		symbol, from_date, cur_date.strftime(YMD_FORMAT), to_date, interval, pivot_number, '{:.1f}'.format(2 * 100 * merge_thres)
 	)
-	records.to_csv(csv_path, index = False)
+	get_display_frame(records).to_csv(csv_path, index = False)
 	report = get_report_content(records, csv_path)
 
 	return alert_success('Analysis Completed') + ['Plot', update_plot(symbol, from_date, to_date, df, downfalls, extensions, behaviors, cur_date, interval), report]
@@ -168,12 +171,14 @@ def on_symbol_changed(symbol, from_date):
 		State('to-date-input', 'date'),
 		#State('interval-input', 'value'),
 		#State('pivot-input', 'value'),
-		State('merge-input', 'value')
+		State('merge-input', 'value'),
+		State('fib-ext-mode-input', 'value')
 	],
+	**get_job_callback_args('fib-ext', 'fib-ext-backtest-button'),
 	prevent_initial_call = True
 )
 #def on_backtest_clicked(n_clicks, symbol, from_date, to_date, interval, pivot_number, merge_thres):
-def on_backtest_clicked(n_clicks, symbol, from_date, to_date, merge_thres):
+def on_backtest_clicked(set_progress, n_clicks, symbol, from_date, to_date, merge_thres, mode):
 	interval = INTERVAL_MONTHLY
 	none_ret = ['Report', None]
 
@@ -185,6 +190,7 @@ def on_backtest_clicked(n_clicks, symbol, from_date, to_date, merge_thres):
 	if from_date > to_date: return alert_error('Invalid duration. Please check and retry.', none_ret)
 	if interval is None: return alert_error('Invalid interval. Please select one and retry.', none_ret)
 	if interval == INTERVAL_QUARTERLY or interval == INTERVAL_YEARLY: return alert_error('Cannot support quarterly or monthly backtest.', none_ret)
+	if mode is None: return alert_error('Invalid level mode. Please select one and retry.', none_ret)
 	#if pivot_number is None: return alert_error('Invalid pivot number. Please select one and retry.', none_ret)
 	
 	pivot_number = PIVOT_NUMBER_FOUR
@@ -205,16 +211,19 @@ def on_backtest_clicked(n_clicks, symbol, from_date, to_date, merge_thres):
 	# records: table-format data
 	# success_rate: accuracy of transaction positions
 	# cum_profit: cumulated profit on percentage basis	
-	records, success_rate, cum_profit = backtest_fib_extension(
-		df, INTERVAL_DAILY, pivot_number, get_safe_num(merge_thres), symbol, from_date, to_date
+	records, success_rate, cum_profit = get_cached_result(
+		lambda: backtest_fib_extension(
+			df, INTERVAL_DAILY, pivot_number, get_safe_num(merge_thres), symbol, from_date, to_date, get_job_progress_reporter(set_progress), mode
+		),
+		'backtest_fib_extension', (symbol, from_date, to_date, pivot_number, get_safe_num(merge_thres), mode), df.index[-1]
 	)
-	csv_path = 'out/FIB-EXT-BKTEST_{}_{}_{}_{}_p{}_m{}%_sr={}%_cp={}%.csv'.format(
-		symbol, from_date, to_date, interval, pivot_number,
+	csv_path = 'out/FIB-EXT-BKTEST_{}_{}_{}_{}_{}_p{}_m{}%_sr={}%_cp={}%.csv'.format(
+		symbol, from_date, to_date, interval, mode.replace(' ', '-'), pivot_number,
 		'{:.1f}'.format(2 * 100 * merge_thres),
 		'{:.1f}'.format(100 * success_rate),
 		'{:.1f}'.format(100 * cum_profit)
 	)
-	records.to_csv(csv_path, index = False)
+	get_display_frame(records).to_csv(csv_path, index = False)
 	report = get_report_content(records, csv_path)
 
 	return alert_success('Backtest Complted.') + ['Report', report]
@@ -6,9 +6,9 @@ from collections import defaultdict
 from constant import *
 from compute import *
 from config import *
-from finta import TA
 from yahoo import *
 from plot import *
+from results import *
 from util import *
 from data import *
 from ui import *
@@ -56,5 +56,9 @@ def on_analyze_clicked(n_clicks, symbol, from_date, to_date):
     if to_date is None: return alert_error('Invalid ending date. Please select one and retry.', none_ret)
     if from_date > to_date: return alert_error('Invalid duration. Please check and retry.', none_ret)
 
-    fig, _ = runStochDivergance(symbol, from_date, to_date)
+    df, _, _ = getPointsGivenR(symbol, 1.02, startDate = from_date, endDate = to_date)
+    fig, _ = get_cached_result(
+        lambda: runStochDivergance(symbol, from_date, to_date, old_data = df),
+        'runStochDivergance', (symbol, from_date, to_date), df.index[-1]
+    )
     return alert_success('Analysis Completed') + [dcc.Graph(figure = fig, className = 'param_est_graph')]
\ No newline at end of file
@@ -7,6 +7,7 @@ from compute import *
 from config import *
 from yahoo import *
 from plot import *
+from results import *
 from util import *
 from data import *
 from ui import *
@@ -25,7 +26,8 @@ parameter_div = get_parameter_div([
     get_cur_date_picker(),
 	get_level_number_input('2'),
 	get_analyze_button('trendline'),
-	get_backtest_button('trendline')
+	get_backtest_button('trendline'),
+	get_job_progress('trendline')
 ])
 out_tab = get_out_tab({
 	'Plot': get_plot_div(),
@@ -130,9 +132,10 @@ def on_symbol_changed(symbol, from_date, cur_date):
 		State('to-date-input', 'date'),
 		State('interval-input', 'value')
 	],
+	**get_job_callback_args('trendline', 'trendline-backtest-button'),
 	prevent_initial_call = True
 )
-def on_backtest_clicked(n_clicks, symbol, from_date, to_date, interval):
+def on_backtest_clicked(set_progress, n_clicks, symbol, from_date, to_date, interval):
 	none_ret = ['Report', None]
 
 	if n_clicks == 0: return alert_hide(none_ret)
@@ -149,14 +152,17 @@ def on_backtest_clicked(n_clicks, symbol, from_date, to_date, interval):
 	# records: table-format data
 	# success_rate: accuracy of transaction positions
 	# cum_profit: cumulated profit on percentage basis	
-	records, success_rate, cum_profit = backtest_trendline(df, symbol, from_date, to_date, interval)
+	records, success_rate, cum_profit = get_cached_result(
+		lambda: backtest_trendline(df, symbol, from_date, to_date, interval, get_job_progress_reporter(set_progress)),
+		'backtest_trendline', (symbol, from_date, to_date, interval), df.index[-1]
+	)
  
 	csv_path = 'out/TRENDLINE-BKTEST_{}_{}_{}_{}_sr={}%_cp={}%.csv'.format(
 		symbol, from_date, to_date, interval,
 		'{:.1f}'.format(100 * success_rate),
 		'{:.1f}'.format(100 * cum_profit)
 	)
-	records.to_csv(csv_path, index = False)
+	get_display_frame(records).to_csv(csv_path, index = False)
 	report = get_report_content(records, csv_path)
 
 	return alert_success('Backtest Complted.') + ['Report', report]
@@ -170,49 +176,21 @@ def update_plot(df, cur_date, level):
 	df['Date'] = list(df.index)	
 	df.set_index('ID', inplace = True)
  
-	window = 3 * level	
-	df['isPivot'] = 0
-	
-	all_dates = list(df['Date'])
-	peaks_x, peaks_y = [], []
-
-	for i in range(window, len(df) - window):
-		h, l = df.loc[i, 'High'], df.loc[i, 'Low']
-		is_peak_h, is_peak_l = True, True
+	window = 3 * level
+	df['isPivot'] = get_pivots(df['High'], df['Low'], window)
 
-		for j in range(i - window, i + window):
-			if df.loc[j, 'High'] > h:
-				is_peak_h = False
-				break
-
-		for j in range(i - window, i + window):
-			if df.loc[j, 'Low'] < l:
-				is_peak_l = False
-				break
-
-		if is_peak_h:
-			peaks_x.append(all_dates[i])
-			peaks_y.append(h)
-		elif is_peak_l:
-			peaks_x.append(all_dates[i])
-			peaks_y.append(l)
-   
-		if is_peak_h and is_peak_l:
-			df.loc[i, 'isPivot'] = 3
-		elif is_peak_h:
-			df.loc[i, 'isPivot'] = 1
-		elif is_peak_l:
-			df.loc[i, 'isPivot'] = 2		
+	# Pivots are marked at their high, or at their low when only the low is extreme
+	peaks = df[df['isPivot'] != 0]
+	peaks_x = list(peaks['Date'])
+	peaks_y = list(np.where(peaks['isPivot'] == 2, peaks['Low'], peaks['High']))
 
 	# Calculate ATR using pandas_ta
 	atr = ta.atr(high = df['High'], low = df['Low'], close = df['Close'], length = 14)
 	stop_percentage = 2 * atr.iloc[-1] / df['Close'].iloc[-1]
 	
 	backcandles = 10 * window
-	df['isBreakOut'] = 0
-  
-	for i in range(backcandles + window, len(df)):
-		df.loc[i, 'isBreakOut'] = is_breakout(i, backcandles, window, df, stop_percentage)
+	channels = ChannelFitter(df)
+	df['isBreakOut'] = channels.get_breakouts(backcandles, window)
 
 	df['breakpointpos'] = df.apply(calculate_breakpoint_pos, axis = 1)	
 	df_breakout = df[df['isBreakOut'] != 0]
@@ -221,7 +199,7 @@ def update_plot(df, cur_date, level):
 
 	for candle in range(backcandles + window, len(df) - 1):
 		if df.iloc[candle].isBreakOut != 0:
-			best_back_l, sl_lows, interc_lows, r_sq_l, best_back_h, sl_highs, interc_highs, r_sq_h = collect_channel(candle, backcandles, window, df)
+			best_back_l, sl_lows, interc_lows, r_sq_l, best_back_h, sl_highs, interc_highs, r_sq_h = channels.collect(candle, backcandles, window)
 			
 			extended_x = np.array(df.index[candle + 1:candle + 15])
 			x1 = np.array(df.index[candle - best_back_l - window:candle + 1])
@@ -1,28 +1,51 @@
 
 from constant import *
+from config import *
 from yahoo import *
+from store import *
 from data import *
-import yfinance as yf
 import pandas as pd
+import joblib
+import glob
+import os
 
+# Derive IPO dates from the first stored bar of each symbol
+# Symbols without a store file keep their current IPO date
 def fill_ipo_dates():
 	df = pd.read_csv('./data/stake.csv')
 
-	for i, row in df.iterrows():
-		y = yf.download(row['symbol'], interval = '1d')
-		ipo = y.iloc[0].name.strftime(YMD_FORMAT)
+	for i, symbol in enumerate(df['symbol']):
+		path = get_price_store_path(symbol)
+		if not os.path.exists(path): continue
 
-		df.at[i, 'ipo'] = ipo
+		dates, _ = map_price_store(path)
+		if len(dates) > 0: df.at[i, 'ipo'] = pd.Timestamp(dates[0]).strftime(YMD_FORMAT)
 
 	df.to_csv('./data/stake.csv', index = False)
 
+# Refresh the stores of a universe of symbols
+# Symbols are ordered by refresh date and fetched in batches of batch_size, one batch at a time
+# (yf.download is serialized by the provider, each batch downloads its symbols on yf_workers threads)
+def refresh_universe(symbols, provider = None, batch_size = yf_batch_size, path_format = PRICE_STORE_PATH):
+	starts = {s: get_refresh_date(path_format.format(s)) for s in symbols}
+	symbols = sorted(symbols, key = lambda s: starts[s])
+
+	for i in range(0, len(symbols), batch_size):
+		refresh_price_stores(symbols[i:i + batch_size], provider, path_format)
+
 def backup_cache():
 	initialize_data()
-	df = pd.read_csv('./data/stake.csv')
+	refresh_universe(load_symbols())
+
+# Convert legacy joblib pickles into columnar store files
+def migrate_cache():
+	for path in glob.glob('./cache/*.che'):
+		symbol = os.path.splitext(os.path.basename(path))[0]
 
-	for i, row in df.iterrows():
-		load_yf(row['symbol'], None, None, None, for_backup = True)
+		save_price_store(joblib.load(path), get_price_store_path(symbol))
+		os.remove(path)
 
 if __name__ == '__main__':
+	#migrate_cache()
 	#fill_ipo_dates()
 	backup_cache()
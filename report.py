@@ -0,0 +1,57 @@
+
+import pandas as pd
+import numpy as np
+
+"""
+Table reports
+
+Rows are collected column by column as typed values (numbers, timestamps, labels) and become one frame at the end.
+The display formats of the columns and the summary rows shown below the records travel with the frame in its attrs,
+and are applied only when the report is rendered, so the numeric results stay usable by other analyses.
+"""
+
+# Columnar record collector of a report
+# formats: column -> format string applied to its values on rendering, missing: column -> text shown for its null values
+class RecordBuilder:
+	def __init__(self, columns, formats = None, missing = None):
+		self.columns = list(columns)
+		self.formats = formats or {}
+		self.missing = missing or {}
+		self.values = {c: [] for c in self.columns}
+		self.footer = []
+
+	def __len__(self):
+		return len(self.values[self.columns[0]])
+
+	# Add a record given its values in column order
+	def append(self, *record):
+		for c, v in zip(self.columns, record): self.values[c].append(v)
+
+	# Add a summary row shown below the records, given as column -> text (an empty row when omitted)
+	def add_footer(self, row = None):
+		self.footer.append(row or {})
+
+	def to_frame(self):
+		res = pd.DataFrame(self.values, columns = self.columns)
+		res.attrs.update(formats = self.formats, missing = self.missing, footer = self.footer)
+
+		return res
+
+# Attach summary rows shown below the records of an existing frame
+def set_report_footer(df, footer):
+	df.attrs['footer'] = list(footer)
+	return df
+
+# Report as shown and exported: formatted records followed by the summary rows
+# Frames without report attributes (such as already rendered ones) are returned as they are
+def get_display_frame(df):
+	formats, missing, footer = df.attrs.get('formats', {}), df.attrs.get('missing', {}), df.attrs.get('footer', [])
+	if not formats and not footer: return df
+
+	res = df.astype(object)
+
+	for c, fmt in formats.items():
+		res[c] = [missing.get(c, '') if pd.isna(v) else fmt.format(v) for v in df[c]]
+
+	rows = res.values.tolist() + [[r.get(c, np.nan) for c in df.columns] for r in footer]
+	return pd.DataFrame(rows, columns = df.columns, dtype = object)
@@ -0,0 +1,111 @@
+
+from constant import *
+from config import *
+import plotly.graph_objects as go
+import plotly.io as pio
+import pandas as pd
+import threading
+import hashlib
+import pickle
+import glob
+import os
+
+"""
+Persistent cache of analysis results
+
+An entry is keyed by the analysis name, its parameters and the date of the last bar it analyzed.
+Once new bars arrive the key changes, and storing the new result removes the entry of the same analysis on older data.
+Entries of other parameters are kept, so the directory is bounded by result_cache_budget_mb instead:
+storing a result removes the least recently used entries until the whole directory fits.
+Figures are stored as plotly JSON.
+"""
+
+# Figure kept as its plotly JSON
+class SerializedFigure:
+	def __init__(self, fig):
+		self.json = fig.to_json()
+
+	def load(self):
+		return pio.from_json(self.json)
+
+# Replace figures in a result (possibly nested in tuples and lists) by their serialized form, and back
+def serialize_result(value):
+	if isinstance(value, go.Figure): return SerializedFigure(value)
+	if isinstance(value, (tuple, list)): return type(value)(serialize_result(v) for v in value)
+
+	return value
+
+def deserialize_result(value):
+	if isinstance(value, SerializedFigure): return value.load()
+	if isinstance(value, (tuple, list)): return type(value)(deserialize_result(v) for v in value)
+
+	return value
+
+def get_result_path(name, params, last_date, path_format = RESULT_CACHE_PATH):
+	digest = hashlib.blake2b(repr(params).encode(), digest_size = 16).hexdigest()
+	return path_format.format(name, digest, pd.Timestamp(last_date).strftime(YMD_FORMAT))
+
+# A hit refreshes the modification time of the entry, which orders entries by last use when pruning
+def load_result(path):
+	if not os.path.exists(path): return None
+
+	try:
+		with open(path, 'rb') as fp:
+			value = deserialize_result(pickle.load(fp))
+
+		os.utime(path)
+		return value
+	except Exception as e:
+		print('Ignoring unreadable result {}: {}'.format(path, e))
+		return None
+
+# Remove the least recently used entries of a result directory until their total size is within budget bytes
+def prune_results(directory, budget):
+	entries = []
+
+	for path in glob.glob(os.path.join(glob.escape(directory), '*.pkl')):
+		try:
+			stat = os.stat(path)
+		except FileNotFoundError:
+			continue
+
+		entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+	total = sum(size for _, size, _ in entries)
+
+	for _, size, path in sorted(entries):
+		if total <= budget: break
+
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
+
+		total -= size
+
+# The file is replaced atomically, then the results of the same analysis on other data are removed
+# and the directory is pruned to budget bytes
+def save_result(path, value, budget = result_cache_budget_mb * 1024 * 1024):
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+	with open(tmp_path, 'wb') as fp:
+		pickle.dump(serialize_result(value), fp, protocol = pickle.HIGHEST_PROTOCOL)
+
+	os.replace(tmp_path, path)
+
+	for stale_path in glob.glob(glob.escape(path.rsplit('@', 1)[0]) + '@*.pkl'):
+		if stale_path != path: os.remove(stale_path)
+
+	prune_results(os.path.dirname(path), budget)
+
+# Result of fn() for an analysis over data ending at last_date, computed only if not cached yet
+def get_cached_result(fn, name, params, last_date, path_format = RESULT_CACHE_PATH):
+	path = get_result_path(name, params, last_date, path_format)
+	value = load_result(path)
+
+	if value is None:
+		value = fn()
+		save_result(path, value)
+
+	return value
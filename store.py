@@ -0,0 +1,67 @@
+
+from constant import *
+import pandas as pd
+import numpy as np
+import threading
+import os
+
+"""
+Columnar on-disk price store
+
+File layout (little-endian):
+	8 bytes  magic (PRICE_STORE_MAGIC)
+	8 bytes  int64 row count n
+	n int64  bar timestamps (ns since epoch)
+	n values per column in PRICE_STORE_COLUMNS order
+
+Every column is contiguous and 8-byte aligned, so the whole file is mapped once
+and each column is a zero-copy view shared through the OS page cache.
+"""
+
+def get_price_store_path(symbol):
+	return PRICE_STORE_PATH.format(symbol)
+
+# Write OHLCV frame into a columnar store file
+# The file is replaced atomically so that readers still mapping the old one are not disturbed
+def save_price_store(df, path):
+	df = df.dropna()
+	n = len(df)
+	tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+	with open(tmp_path, 'wb') as fp:
+		fp.write(PRICE_STORE_MAGIC)
+		fp.write(np.array([n], dtype = '<i8').tobytes())
+		fp.write(df.index.values.astype('datetime64[ns]').view('<i8').tobytes())
+
+		for col, dtype in PRICE_STORE_COLUMNS:
+			fp.write(df[col].to_numpy(dtype = dtype).tobytes())
+
+	os.replace(tmp_path, path)
+
+# Map a columnar store file and return its columns as read-only arrays
+def map_price_store(path):
+	buf = np.memmap(path, dtype = np.uint8, mode = 'r')
+
+	if bytes(buf[:8]) != PRICE_STORE_MAGIC:
+		raise ValueError('Invalid price store file: {}'.format(path))
+
+	n = int(buf[8:16].view('<i8')[0])
+	offset = 16
+
+	dates = buf[offset:offset + n * 8].view('<i8')
+	offset += n * 8
+
+	cols = {}
+
+	for col, dtype in PRICE_STORE_COLUMNS:
+		cols[col] = buf[offset:offset + n * 8].view(dtype)
+		offset += n * 8
+
+	return dates, cols
+
+# Load OHLCV frame backed by the memory-mapped store file
+def load_price_store(path):
+	dates, cols = map_price_store(path)
+
+	index = pd.DatetimeIndex(dates.view('datetime64[ns]'), name = 'Date')
+	return pd.DataFrame(cols, index = index, copy = False)
@@ -2,13 +2,430 @@
 from yahoo import *
 from data import *
 from util import *
+from store import *
+from lru import *
+from preprocess import *
+from compute import *
+from results import *
+from collections import deque
+from report import *
+import plotly.graph_objects as go
 import pandas as pd
-import joblib
+import numpy as np
+import threading
+import tempfile
+import time
+import os
 
 def test_cached_df():
-	df = joblib.load('./cache/AAPL.che')
+	df = load_price_store(get_price_store_path('AAPL'))
 	print(df.tail(3))
 
+def test_price_store():
+	df = pd.DataFrame({
+		'Open': [1.0, 2.0, 3.0], 'High': [1.5, 2.5, 3.5], 'Low': [0.5, 1.5, 2.5], 'Close': [1.2, 2.2, 3.2], 'Volume': [10, 20, 30]
+	}, index = pd.DatetimeIndex(['2023-01-03', '2023-01-04', '2023-01-05'], name = 'Date'))
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		path = os.path.join(tmp_dir, 'TEST.col')
+		save_price_store(df, path)
+
+		pd.testing.assert_frame_equal(load_price_store(path), df)
+
+# Provider serving bars from prepared frames instead of Yahoo Finance
+class FakeProvider:
+	def __init__(self, dfs):
+		self.dfs = dfs
+		self.requests = []
+
+	def fetch(self, symbol, start, end):
+		self.requests.append((symbol, start, end))
+
+		df = self.dfs[symbol]
+		return df[(df.index >= start) & (df.index < end)]
+
+	def fetch_many(self, symbols, start, end):
+		self.requests.append((tuple(symbols), start, end))
+		return {s: self.dfs[s][(self.dfs[s].index >= start) & (self.dfs[s].index < end)] for s in symbols}
+
+def test_refresh_price_store():
+	df = load_price_store(get_price_store_path('AAPL'))
+	provider = FakeProvider({'AAPL': df})
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		path = os.path.join(tmp_dir, 'AAPL.col')
+		save_price_store(df[:-20], path)
+
+		pd.testing.assert_frame_equal(refresh_price_store('AAPL', provider, path), df)
+		assert provider.requests[-1][1] == df.index[-21].strftime(YMD_FORMAT)
+
+		pd.testing.assert_frame_equal(refresh_price_store('AAPL', provider, path), df)
+
+def test_refresh_universe():
+	symbols = ['AAPL', 'AMZN', 'MSFT', 'META', 'TSLA']
+	dfs = {s: load_price_store(get_price_store_path(s)) for s in symbols}
+	provider = FakeProvider(dfs)
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		path_format = os.path.join(tmp_dir, '{}.col')
+
+		# AMZN and MSFT share a refresh date, META is stale and TSLA is not stored yet
+		for s, cut in (('AAPL', 0), ('AMZN', 30), ('MSFT', 30), ('META', 300)):
+			save_price_store(dfs[s][:len(dfs[s]) - cut], path_format.format(s))
+
+		refresh_universe(symbols, provider, 2, path_format)
+
+		for s in symbols:
+			pd.testing.assert_frame_equal(load_price_store(path_format.format(s)), dfs[s])
+
+	# Batches follow the refresh dates and a stale symbol is fetched apart from the rest of its batch
+	assert [r[0] for r in provider.requests] == [('TSLA',), ('META',), ('AMZN', 'MSFT'), ('AAPL',)]
+	assert provider.requests[0][1] == '1900-01-01'
+	assert provider.requests[2][1] == dfs['AMZN'].index[-31].strftime(YMD_FORMAT)
+
+def test_price_views():
+	df = load_price_store(get_price_store_path('AAPL')).round(4)
+
+	for interval in INTERVAL_ALL:
+		for start, end in [('1900-01-01', '2100-01-01'), ('2001-02-14', '2011-08-17'), ('2023-03-08', '2023-03-10')]:
+			expected = resample_prices(df.loc[start:end], interval)
+			res = slice_price_view('AAPL', start, end, interval)
+
+			pd.testing.assert_frame_equal(res[expected.columns], expected, check_freq = False)
+
+def test_lru_cache():
+	cache = LRUCache(3 * 800)
+
+	for i in range(4):
+		cache.put(i, np.zeros(100))
+
+	assert cache.get(0) is None and cache.get(3) is not None
+	cache.get(1)
+	cache.put(4, np.zeros(100))
+
+	assert 1 in cache and 2 not in cache
+	assert cache.stats()['evictions'] == 2 and cache.nbytes == 3 * 800
+
+def test_single_flight():
+	flights, calls, results = SingleFlight(), [], []
+
+	def load():
+		calls.append(1)
+		time.sleep(0.2)
+		return 'AAPL'
+
+	threads = [threading.Thread(target = lambda: results.append(flights.do('AAPL', load))) for _ in range(8)]
+	for t in threads: t.start()
+	for t in threads: t.join()
+
+	assert len(calls) == 1 and results == ['AAPL'] * 8
+
+def test_zigzag():
+	a = np.array([3., 1., 4., 1., 5., 9., 2., 6., 5., 3.])
+	starts, ends = np.array([0, 3, 7]), np.array([4, 8, 10])
+
+	max_pos, min_pos = get_window_extrema(a, starts, ends)
+
+	assert list(max_pos) == [s + np.argmax(a[s:e]) for s, e in zip(starts, ends)]
+	assert list(min_pos) == [s + np.argmin(a[s:e]) for s, e in zip(starts, ends)]
+
+	df = load_price_store(get_price_store_path('AAPL'))
+	zdf = get_zigzag(df, df.index[-1])
+
+	assert (np.diff(zdf['Sign']) != 0).all() and zdf.index.is_monotonic_increasing
+	assert (df.loc[zdf.index, 'Close'] == zdf['Close']).all()
+
+def test_pivots():
+	df = load_price_store(get_price_store_path('AAPL'))[-300:]
+	highs, lows = df['High'].to_numpy(), df['Low'].to_numpy()
+
+	for window in (1, 6, 12):
+		expected = np.zeros(len(df), dtype = np.int64)
+
+		for i in range(window, len(df) - window):
+			expected[i] = (highs[i] == highs[i - window:i + window + 1].max()) + 2 * (lows[i] == lows[i - window:i + window + 1].min())
+
+		assert (get_pivots(df['High'], df['Low'], window) == expected).all()
+
+def test_channel_fitter():
+	from scipy import stats
+
+	df = load_price_store(get_price_store_path('AAPL'))[-400:]
+	df.index = range(len(df))
+	window, backcandles = 6, 60
+	df['isPivot'] = get_pivots(df['High'], df['Low'], window)
+
+	channels = ChannelFitter(df)
+
+	for candle in range(backcandles + window, len(df), 5):
+		expected = [0] * 8
+
+		for i in range(backcandles - backcandles // 2, backcandles + backcandles // 2, window):
+			local_df = df.iloc[candle - i - window:candle - window]
+
+			for kind, col, best in ((2, 'Low', 0), (1, 'High', 4)):
+				points = local_df[local_df['isPivot'] == kind][col][-4:]
+				if len(points) < 2: continue
+
+				slope, intercept, r, _, _ = stats.linregress(points.index, points.values)
+
+				if r ** 2 * len(points) > expected[best + 3] and r ** 2 > 0.85:
+					expected[best:best + 4] = [i, slope, intercept, r ** 2 * len(points)]
+
+		assert channels.collect(candle, backcandles, window) == tuple(expected)
+
+def test_trendline_workers():
+	import compute
+
+	df = load_price_store(get_price_store_path('AAPL'))['2021-01-01':'2022-12-31']
+	results = []
+
+	for workers in (1, 2):
+		compute.backtest_workers = workers
+		results.append(backtest_trendline(df.copy(), 'AAPL', '2021-01-01', '2022-12-31', INTERVAL_DAILY))
+
+	compute.backtest_workers = backtest_workers
+
+	pd.testing.assert_frame_equal(results[0][0], results[1][0])
+	assert results[0][1:] == results[1][1:]
+
+def test_next_pivots():
+	assert get_next_pivots(np.array([0, 1, 0, 0, 3, 0, 0])).tolist() == [1, 4, 4, 4, 6, 6, 6]
+	assert get_next_pivots(np.array([0, 0, 0])).tolist() == [2, 2, 2]
+
+def test_fib_ext_behaviors():
+	closes = [10, 10, 10, 12, 12, 12, 12, 12, 12, 12]
+	df = pd.DataFrame({
+		'open': closes, 'high': [c + 0.5 for c in closes], 'low': [c - 0.5 for c in closes], 'close': closes
+	}, index = pd.date_range('2023-01-02', periods = 10, freq = 'W'))
+
+	level = [(0, 'a', 11.0)]
+	assert get_fib_ext_behaviors(df, [level], None, 0.05) == {level[0]: 'Res_Break'}
+
+	# Never crossed
+	level = [(0, 'a', 20.0)]
+	assert get_fib_ext_behaviors(df, [level], None, 0.05) == {level[0]: None}
+
+def test_fib_ext_signs():
+	rng = np.random.default_rng(0)
+	opens = rng.normal(10, 1, 60)
+	df = pd.DataFrame({'Open': opens, 'Close': opens + rng.integers(-1, 2, 60)})
+
+	for interval in (INTERVAL_DAILY, INTERVAL_WEEKLY):
+		entry_signs, exit_signs = get_fib_ext_signs(df, interval)
+		signs = deque(maxlen = 14 if interval == INTERVAL_DAILY else 4)
+
+		for i, sign in enumerate(np.sign(df['Close'] - df['Open'])):
+			signs.append(int(sign))
+
+			assert entry_signs[i] == (1 if signs.count(1) > len(signs) * 3 / 5 else -1 if signs.count(-1) > len(signs) * 4 / 5 else 0)
+			assert exit_signs[i] == (1 if signs.count(1) > len(signs) * 0.5 else -1 if signs.count(-1) > len(signs) * 0.5 else 0)
+
+def test_fib_ext_trades():
+	df = pd.DataFrame({'High': [11, 12, 13, 15], 'Low': [9, 10, 11, 13]})
+	assert get_level_hits(df, [12.5, 9.5]).tolist() == [True, False, True, False]
+
+	dates = pd.date_range('2023-01-02', periods = 6, freq = 'D')
+	entry_signs = np.array([1, 1, 0, -1, 0, 0])
+	exit_signs = np.array([1, -1, 0, -1, 1, 0])
+	has_level = np.array([True, True, True, True, False, False])
+
+	# The short opened at the exit candle of the long waits for the next candle
+	assert list(get_fib_ext_trades(dates, entry_signs, exit_signs, has_level)) == [(0, 1, 1), (3, 4, -1)]
+	assert list(get_fib_ext_trades(dates, entry_signs, exit_signs, has_level & (np.arange(6) < 3))) == [(0, 1, 1)]
+	assert list(get_fib_ext_trades(dates[:3], entry_signs[:3], np.ones(3, int), has_level[:3])) == [(0, None, 1)]
+
+def test_walk_forward_level_hits():
+	df = load_price_store(get_price_store_path('AAPL'))['2010-01-01':'2022-12-31']
+	has_level = get_walk_forward_level_hits(df, 4, 0.04)
+
+	# Levels at a candle never depend on later candles
+	assert has_level.any()
+	for end in (300, 1500, len(df) - 5):
+		assert (get_walk_forward_level_hits(df.iloc[:end], 4, 0.04) == has_level[:end]).all()
+
+def test_fib_extensions():
+	assert get_level_groups([10.0, 10.3, 10.6, 11.5, 20.0, 20.1], 0.04).tolist() == [0, 3, 4]
+
+	dates = pd.date_range('2023-01-02', periods = 4, freq = 'D')
+	zdf = pd.DataFrame({'close': [20.0, 10.0, 21.0, 11.0]}, index = dates)
+	groups = get_fib_extensions(zdf, [(dates[0], dates[1]), (dates[2], dates[3])], 0.05, 1, 50)
+
+	assert [[(i, j, lv) for i, _, _, _, _, j, lv in g] for g in groups] == [[(0, 0, 26.18), (1, 0, 27.18)], [(0, 1, 36.18), (1, 1, 37.18)]]
+
+def test_turning_points():
+	x = np.array([10., 11, 13, 12, 10, 9, 11, 14, 15, 13, 12, 14, 16, 15])
+	series = pd.Series(x, index = pd.date_range('2020-01-01', periods = len(x)))
+
+	assert getPointsforArray(x, 1.1) == ([2, 8, 12], [5, 10])
+	assert getPointsforArray(series, 1.1) == getPointsforArray(x.tolist(), 1.1)
+
+# Original turning point error: segment lookup and sequential sum at each scaled x
+def _get_turning_error_reference(data, Tps):
+	lins = getLinears(data, Tps)
+	i, E = lins[0].x1, 0
+
+	while i < lins[-1].x2:
+		l = getLinearForX(lins, i)
+		E += abs(data[getUnscaledX(i, data)] - l.getY(i)) * 1 / len(data)
+		i += 1 / len(data)
+
+	return E * 10
+
+def test_turning_ratio():
+	values = load_price_store(get_price_store_path('AAPL'))['Close'].to_numpy()[-1000:]
+	scaled = getScaledY(values)
+
+	for tps in ([0, 120, 480, 999], [0, 999], [5, 37, 38, 610, 702], [3, 250, 999], [0, 1, 2, 500, 998, 999]):
+		assert np.isclose(get_turning_error(scaled, tps), _get_turning_error_reference(scaled, tps))
+		assert np.isclose(getMSE(scaled, getLinears(scaled, tps)), _get_turning_error_reference(scaled, tps))
+
+	for R in (1.02, 1.1):
+		highs, lows = getPointsforArray(values, R)
+		tps = sorted(highs + lows)
+		assert np.isclose(get_turning_error(scaled, tps), _get_turning_error_reference(scaled, tps))
+
+	R, (highs, lows) = search_turning_ratio(values, scaled, 0.23, 0.8)
+	assert 0.23 < get_turning_error(scaled, sorted(highs + lows)) < 0.8
+	assert (highs, lows) == getPointsforArray(values, R)
+
+def test_turning_memo():
+	values = load_price_store(get_price_store_path('AMZN'))['Close'].to_numpy()
+	turning_caches.clear()
+
+	highs, lows = getPointsforArray(values, 1.05)
+	highs.append(-1)
+
+	assert getPointsforArray(values.copy(), 1.05) == (highs[:-1], lows)
+	assert turning_caches.stats()['hits'] >= 1 and len(turning_caches) == 1
+
+	getPointsforArray(values[1:], 1.05)
+	assert len(turning_caches) == 2
+
+def test_turning_point_stream():
+	values = load_price_store(get_price_store_path('AMZN'))['Low'].to_numpy()[-400:]
+	stream = TurningPointStream(1.02)
+
+	for n, v in enumerate(values, 1):
+		stream.push(v)
+		assert stream.points() == getPointsforArray(values[:n], 1.02)
+
+def test_divergence_stream():
+	df = load_price_store(get_price_store_path('AAPL'))['2021-11-01':'2022-07-01']
+	df = df.rename(columns = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Volume': 'volume', 'Close': 'close'})
+
+	stream, seen = StochDivergenceStream(df), set()
+
+	for n in range(1, len(df) + 1):
+		new1, new2 = stream.update(n)
+		type1, type2, _ = runStochDivergance('AAPL', return_csv = True, old_data = df[:n])
+
+		for lines, new in ((type1, new1), (type2, new2)):
+			tups = [(b['x0'], b['x1'], a['y0'], a['y1'], b['y0'], b['y1']) for a, b in lines]
+			assert new == list(dict.fromkeys(t for t in tups if t not in seen))
+			seen.update(tups)
+
+def test_divergence_checkpoint():
+	df = load_price_store(get_price_store_path('AAPL'))['2021-11-01':'2022-07-01']
+	df = df.rename(columns = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Volume': 'volume', 'Close': 'close'})
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		expected = get_divergence_data('AAPL', '2021-11-01', '2022-07-01', df, os.path.join(tmp_dir, 'full_{}_{}.pkl'))
+
+		path_format = os.path.join(tmp_dir, '{}_{}.pkl')
+		path = path_format.format('AAPL', '2021-11-01')
+
+		shorter = get_divergence_data('AAPL', '2021-11-01', '2022-05-01', df[:'2022-05-01'], path_format)
+		assert shorter == get_divergence_data('AAPL', '2021-11-01', '2022-05-01', df[:'2022-05-01'], os.path.join(tmp_dir, 'short_{}_{}.pkl'))
+
+		# Extending the range resumes from the last scanned day
+		assert get_divergence_data('AAPL', '2021-11-01', '2022-07-01', df, path_format) == expected
+		assert load_divergence_checkpoint(path, df)['last_day'] == '2022-07-01'
+
+		# A shorter range is answered from the checkpoint
+		assert get_divergence_data('AAPL', '2021-11-01', '2022-05-01', df, path_format) == shorter
+
+		# Changed bars invalidate the checkpoint
+		changed = df.copy()
+		changed.iloc[5, changed.columns.get_loc('close')] += 1
+		assert load_divergence_checkpoint(path, changed) is None
+
+def test_track_progress():
+	reports = []
+
+	assert list(track_progress(range(250), lambda done, total: reports.append((done, total)))) == list(range(250))
+	assert len(reports) == 100 and reports[0] == (3, 250) and reports[-1] == (250, 250)
+
+def test_result_cache():
+	calls = []
+
+	def analyze():
+		calls.append(1)
+		return pd.DataFrame({'Profit': [0.1, -0.2]}), go.Figure(go.Scatter(x = [1, 2], y = [3, 4]))
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		path_format = os.path.join(tmp_dir, '{}_{}@{}.pkl')
+
+		df, fig = get_cached_result(analyze, 'analyze', ('AAPL', 0.5), '2023-01-05', path_format)
+		cached_df, cached_fig = get_cached_result(analyze, 'analyze', ('AAPL', 0.5), '2023-01-05', path_format)
+
+		assert len(calls) == 1
+		pd.testing.assert_frame_equal(cached_df, df)
+		assert cached_fig.to_dict() == fig.to_dict()
+
+		# Other parameters and newer bars are computed again, newer bars replacing the older result
+		get_cached_result(analyze, 'analyze', ('AAPL', 0.25), '2023-01-05', path_format)
+		get_cached_result(analyze, 'analyze', ('AAPL', 0.5), '2023-01-06', path_format)
+
+		assert len(calls) == 3
+		assert not os.path.exists(get_result_path('analyze', ('AAPL', 0.5), '2023-01-05', path_format))
+		assert len(os.listdir(tmp_dir)) == 2
+
+def test_report_builder():
+	res = RecordBuilder(['Date', 'Price', 'Note'], formats = {'Date': '{:%d %b %Y}', 'Price': '${:.2f}'}, missing = {'Price': 'n/a'})
+	res.append(pd.Timestamp('2023-01-05'), 1.5, 'a')
+	res.append(pd.Timestamp('2023-01-06'), np.nan, 'b')
+	res.add_footer({'Note': 'Total: 2'})
+
+	df = res.to_frame()
+	assert df['Price'].dtype == np.float64 and len(res) == 2
+
+	shown = get_display_frame(df)
+	assert shown['Date'].tolist()[:2] == ['05 Jan 2023', '06 Jan 2023']
+	assert shown['Price'].tolist()[:2] == ['$1.50', 'n/a']
+	assert shown.iloc[-1]['Note'] == 'Total: 2' and pd.isna(shown.iloc[-1]['Date'])
+	assert get_display_frame(shown) is shown
+
+def test_result_budget():
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		paths = [os.path.join(tmp_dir, 'analyze_{}@2023-01-05.pkl'.format(i)) for i in range(4)]
+
+		for i, path in enumerate(paths[:3]):
+			save_result(path, np.zeros(1000))
+			os.utime(path, ns = (i * 10 ** 9, i * 10 ** 9))
+
+		# Loading the oldest entry makes it the most recently used, so the next oldest goes first
+		load_result(paths[0])
+		save_result(paths[3], np.zeros(1000), budget = 3.5 * os.path.getsize(paths[0]))
+
+		assert [os.path.exists(path) for path in paths] == [True, False, True, True]
+
+def test_trading_calendar():
+	df = load_price_store(get_price_store_path('AAPL'))['2023-01-01':'2023-03-01']
+	calendar = TradingCalendar(df.index)
+
+	queries = pd.date_range('2022-12-25', '2023-03-10', freq = 'D')
+
+	for date in queries:
+		backward, forward = df.index[df.index <= date], df.index[df.index >= date]
+
+		assert get_nearest_backward_date(df, date.to_pydatetime()) == (backward[-1] if len(backward) > 0 else None)
+		assert get_nearest_forward_date(df, date.to_pydatetime()) == (forward[0] if len(forward) > 0 else None)
+
+	assert calendar.get_backward(get_timestamp('2023-01-08')) == pd.Timestamp('2023-01-06')
+	assert (calendar.get_forward_positions(queries) == [len(df.index[df.index < date]) for date in queries]).all()
+	assert (calendar.get_backward_positions(queries) == [len(df.index[df.index <= date]) - 1 for date in queries]).all()
+
 def test_stake():
 	initialize_data()
 
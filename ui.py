@@ -4,6 +4,7 @@ from constant import *
 from config import *
 from util import *
 from data import *
+from report import *
 import dash_bootstrap_components as dbc
 import dash
 
@@ -190,6 +191,46 @@ def get_run_button(prefix):
 		]
 	)
 
+# Cancel button and progress bar of the background job a button starts (see get_job_callback_args)
+# While the job runs, the cancel button takes the place of the job button so that clicking it again cancels the job
+def get_job_progress(prefix):
+	return html.Div(
+		className = 'scenario_button',
+		children = [
+			html.Button(
+				'CANCEL',
+				id = prefix + '-cancel-button',
+				n_clicks = 0,
+				style = {'display': 'none'}
+			),
+			dbc.Progress(
+				id = prefix + '-progress',
+				value = 0,
+				label = '',
+				style = {'display': 'none'}
+			)
+		]
+	)
+
+# Callback arguments running a button callback as a background job with the progress bar and cancel button of get_job_progress
+# The callback receives set_progress as its first argument
+def get_job_callback_args(prefix, button_id):
+	return dict(
+		background = True,
+		progress = [Output(prefix + '-progress', 'value'), Output(prefix + '-progress', 'label')],
+		progress_default = [0, ''],
+		running = [
+			(Output(button_id, 'style'), {'display': 'none'}, {}),
+			(Output(prefix + '-cancel-button', 'style'), {}, {'display': 'none'}),
+			(Output(prefix + '-progress', 'style'), {'display': 'inline-flex', 'width': '200px', 'verticalAlign': 'middle'}, {'display': 'none'})
+		],
+		cancel = [Input(prefix + '-cancel-button', 'n_clicks')]
+	)
+
+# Progress callback (done, total) of compute functions showing on the progress bar of a background job
+def get_job_progress_reporter(set_progress):
+	return lambda done, total: set_progress([100 * done / total, '{}%'.format(100 * done // total)])
+
 def get_scenario_div(children):
 	return html.Div(
 		className = 'scenario_div',
@@ -261,6 +302,29 @@ def get_level_number_input(value = None):
 		]
 	)
 
+# Level mode selector, with help on how each mode finds its pivots
+def get_fib_ext_mode_input(pivot_number = PIVOT_NUMBER_ALL.index(PIVOT_NUMBER_FOUR) + 1):
+	return html.Div(
+		className = 'scenario_block',
+		children = [
+			dcc.Dropdown(
+				id = 'fib-ext-mode-input',
+				placeholder = 'Levels',
+				options = FIB_EXT_MODE_ALL,
+				style = {'width': '160px'},
+				value = FIB_EXT_MODE_STATIC
+			),
+			dbc.Tooltip(
+				[
+					html.Div('{}: {}.'.format(mode, FIB_EXT_MODE_NOTES[mode].format(fibo_walk_forward_ratio, pivot_number)))
+					for mode in FIB_EXT_MODE_ALL
+				] + [html.Div('Results differ by pivot detection as well as by lookahead.')],
+				target = 'fib-ext-mode-input',
+				placement = 'bottom'
+			)
+		]
+	)
+
 def get_merge_thres_input():
 	return html.Div(
 		className = 'scenario_block',
@@ -277,6 +341,8 @@ def get_merge_thres_input():
 	)
 
 def get_report_content(df, path):
+	df = get_display_frame(df)
+
 	return html.Div(
 		children = [
 			html.Div(path, style = {'text-align': 'right', 'margin-top': '10px', 'margin-bottom': '10px', 'padding-right': '20px'}),
@@ -334,6 +400,8 @@ def get_multi_report_content(df_list, title_list, path):
 	)
  
 def get_dashboard_content(df, last_date):
+	df = get_display_frame(df)
+
 	return html.Div(
 		children = [
 			html.H2(
@@ -1,6 +1,27 @@
 
 from datetime import datetime, timedelta
 from constant import *
+import importlib
+
+# Stand-in for a module (or one of its attributes) that is imported on first use
+class LazyImport:
+	def __init__(self, module_name, attr_name = None):
+		self.module_name = module_name
+		self.attr_name = attr_name
+		self.target = None
+
+	def load(self):
+		if self.target is None:
+			target = importlib.import_module(self.module_name)
+			self.target = target if self.attr_name is None else getattr(target, self.attr_name)
+
+		return self.target
+
+	def __getattr__(self, name):
+		return getattr(self.load(), name)
+
+	def __call__(self, *args, **kwargs):
+		return self.load()(*args, **kwargs)
 
 def get_today_str(format_str = YMD_FORMAT):
 	return datetime.now().strftime(format_str)
@@ -47,25 +68,33 @@ def get_safe_num(v):
 		except ValueError:
 			return 0
 
-def get_nearest_backward_date(df, cur_date):
-	res = cur_date
-
-	while res not in df.index:
-		res = res - timedelta(days = 1)
+# Trading dates of a frame (its sorted DatetimeIndex), answering nearest-date queries by binary search
+# Positions of batch queries are len(index) when no date is found
+class TradingCalendar:
+	def __init__(self, index):
+		self.index = index
 
-		if res < df.index[0]: return None
+	# Position of the last trading date on or before each date, -1 when there is none
+	def get_backward_positions(self, dates):
+		return self.index.searchsorted(dates, side = 'right') - 1
 
-	return res
+	# Position of the first trading date on or after each date, len(index) when there is none
+	def get_forward_positions(self, dates):
+		return self.index.searchsorted(dates, side = 'left')
 
-def get_nearest_forward_date(df, cur_date):
-	res = cur_date
+	def get_backward(self, date):
+		pos = self.get_backward_positions(date)
+		return None if pos < 0 else self.index[pos]
 
-	while res not in df.index:
-		res = res + timedelta(days = 1)
+	def get_forward(self, date):
+		pos = self.get_forward_positions(date)
+		return None if pos >= len(self.index) else self.index[pos]
 
-		if res > df.index[-1]: return None
+def get_nearest_backward_date(df, cur_date):
+	return TradingCalendar(df.index).get_backward(cur_date)
 
-	return res
+def get_nearest_forward_date(df, cur_date):
+	return TradingCalendar(df.index).get_forward(cur_date)
 
 def write_line(fp, li, delimiter = ','):
 	fp.write(delimiter.join([str(x) for x in li]) + '\n')
@@ -1,59 +1,218 @@
 
 from datetime import datetime
-from collections import defaultdict
 from constant import *
 from config import *
 from util import *
+from store import *
+from lru import *
 from data import *
 import yfinance as yf
-import joblib
+import threading
 import glob
 import os
 
-yf_caches = defaultdict(lambda: None)
+# Daily OHLCV source backed by Yahoo Finance
+# fetch() returns the bars in [start, end) as a frame with PRICE_STORE_COLUMNS
+# fetch_many() does the same for several symbols at once and returns {symbol: frame}
+# yf.download resets and fills module-level state (yfinance.shared._DFS) on every call, so overlapping calls
+# would mix up each other's results and calls into it are serialized; a multi-symbol call still downloads
+# its tickers concurrently on yf_workers threads, which is where fetching gets its parallelism
+class YahooProvider:
+	def __init__(self):
+		self.lock = threading.Lock()
+
+	def fetch(self, symbol, start, end):
+		with self.lock:
+			df = yf.download(symbol, start = start, end = end, interval = '1d', progress = False)
+
+		return df.drop('Adj Close', axis = 1)
+
+	def fetch_many(self, symbols, start, end):
+		if len(symbols) == 1: return {symbols[0]: self.fetch(symbols[0], start, end)}
+
+		with self.lock:
+			df = yf.download(symbols, start = start, end = end, interval = '1d', group_by = 'ticker', threads = yf_workers, progress = False)
+
+		return {s: df[s.upper()].drop('Adj Close', axis = 1).dropna(how = 'all') for s in symbols}
+
+yf_provider = YahooProvider()
+yf_caches = LRUCache(yf_cache_budget_mb * 1024 * 1024)
+yf_flights = SingleFlight()
+yf_refreshed = set()
+
+# Get a value from yf_caches, calling load() on a miss
+# Concurrent requests for the same key are coalesced so that only one of them loads
+def load_cached(key, load):
+	def get_or_load():
+		value = yf_caches.get(key)
+
+		if value is None:
+			value = load()
+			yf_caches.put(key, value)
+
+		return value
+
+	return yf_flights.do(key, get_or_load)
+
+# Get the stored daily history of a symbol (None if not stored yet) and the date to refresh it from
+# The last stored bar is fetched again, as it may have been saved intraday
+def get_refresh_start(path):
+	df = load_price_store(path) if os.path.exists(path) else None
+
+	if df is None or len(df) == 0: return None, '1900-01-01'
+	return df, df.index[-1].strftime(YMD_FORMAT)
+
+# Append newly fetched bars to a stored history and write it back
+def merge_price_store(df, delta, path):
+	delta = delta.dropna()
+
+	if df is not None:
+		delta = delta[delta.index >= df.index[-1]]
+		if len(delta) == 0: return df
+
+		df = pd.concat([df[df.index < delta.index[0]], delta[[col for col, _ in PRICE_STORE_COLUMNS]]])
+	else:
+		df = delta
+
+	save_price_store(df, path)
+	return load_price_store(path)
+
+# Bring the stored daily history of a symbol up to date
+# Only the bars from the last stored date onwards are fetched
+def refresh_price_store(symbol, provider = None, path = None):
+	if provider is None: provider = yf_provider
+	if path is None: path = get_price_store_path(symbol)
+
+	df, start = get_refresh_start(path)
+	delta = provider.fetch(symbol, start, get_offset_date_str(get_today_str(), 1))
+
+	return merge_price_store(df, delta, path)
+
+# Date to refresh a stored daily history from, read from the mapped dates of the store only
+def get_refresh_date(path):
+	if not os.path.exists(path): return '1900-01-01'
+
+	dates, _ = map_price_store(path)
+	return pd.Timestamp(dates[-1]).strftime(YMD_FORMAT) if len(dates) > 0 else '1900-01-01'
+
+# Split symbols, in order of refresh date, into runs whose dates are within yf_batch_start_days of the run's first one
+def get_refresh_groups(symbols, starts):
+	groups = []
+
+	for s in sorted(symbols, key = lambda s: starts[s]):
+		if len(groups) > 0 and get_duration(starts[groups[-1][0]], starts[s]) <= yf_batch_start_days:
+			groups[-1].append(s)
+		else:
+			groups.append([s])
+
+	return groups
+
+# Bring the stored daily histories of several symbols up to date with batched fetches
+# Only symbols with close refresh dates share a fetch, so that a stale store does not make the others download its whole gap
+def refresh_price_stores(symbols, provider = None, path_format = PRICE_STORE_PATH):
+	if provider is None: provider = yf_provider
+
+	stored = {s: get_refresh_start(path_format.format(s)) for s in symbols}
+	end = get_offset_date_str(get_today_str(), 1)
+
+	for group in get_refresh_groups(symbols, {s: start for s, (_, start) in stored.items()}):
+		deltas = provider.fetch_many(group, stored[group[0]][1], end)
+
+		for s in group:
+			merge_price_store(stored[s][0], deltas[s], path_format.format(s))
+
+# Refresh the store of a symbol once per process
+def refresh_symbol(symbol):
+	if symbol in yf_refreshed: return
+
+	refresh_price_store(symbol)
+	yf_refreshed.add(symbol)
+
+def get_price_view_path(symbol, interval):
+	return PRICE_VIEW_PATH.format(symbol, INTERVAL_LETTER_DICT[interval])
+
+# Aggregate daily bars into bars of the given interval
+def resample_prices(df, interval):
+	df = df.groupby(pd.Grouper(freq = INTERVAL_LETTER_DICT[interval])).agg(INTERVAL_AGG_DICT)
+	return df.dropna()
+
+# Aggregate daily bars of a single bucket into one bar labelled by the bucket
+def get_bucket_bar(df, label):
+	return pd.DataFrame({
+		'Open': [df['Open'].iloc[0]],
+		'Close': [df['Close'].iloc[-1]],
+		'High': [df['High'].max()],
+		'Low': [df['Low'].min()],
+		'Volume': [df['Volume'].sum()]
+	}, index = pd.DatetimeIndex([label], name = 'Date'))
+
+# Load the materialized bars of a symbol for an interval
+# A view is rebuilt from the daily store whenever the store has been rewritten since
+# Loaded views are kept in yf_caches, keyed by the version (mtime) of the daily store
+def load_price_view(symbol, interval):
+	version = os.stat(get_price_store_path(symbol)).st_mtime_ns
+	return load_cached((symbol, interval, version), lambda: build_price_view(symbol, interval, version))
+
+def build_price_view(symbol, interval, version):
+	path = get_price_view_path(symbol, interval)
+
+	if not os.path.exists(path) or os.stat(path).st_mtime_ns < version:
+		if interval == INTERVAL_DAILY:
+			view = load_price_store(get_price_store_path(symbol)).dropna().round(4)
+		else:
+			view = resample_prices(load_price_view(symbol, INTERVAL_DAILY), interval)
+
+		save_price_store(view, path)
+
+	return load_price_store(path)
+
+# Get bars of [start, end] at an interval from the materialized views
+# Buckets cut by the range edges are re-aggregated from daily bars, as if the sliced daily bars were resampled
+def slice_price_view(symbol, start, end, interval):
+	daily = load_price_view(symbol, INTERVAL_DAILY).loc[start:end]
+	if interval == INTERVAL_DAILY: return daily
+
+	view = load_price_view(symbol, interval)
+	if len(daily) == 0: return resample_prices(daily, interval)
+
+	first, last = view.index.searchsorted(daily.index[0]), view.index.searchsorted(daily.index[-1])
+	if first == last: return resample_prices(daily, interval)
+
+	return pd.concat([
+		get_bucket_bar(daily[daily.index <= view.index[first]], view.index[first]),
+		view.iloc[first + 1:last],
+		get_bucket_bar(daily[daily.index > view.index[last - 1]], view.index[last])
+	])
 
 def load_yf(symbol, start, end, interval, fit_today = True, for_backup = False):
 	if start is None: start = '1900-01-01'
 	if end is None: end = '2100-01-01'
 	if interval is None: interval = INTERVAL_DAILY
     
-	df = yf_caches[symbol]
-	
-	if df is None:
-		if yf_on:
-			df = yf.download(symbol, start = start, end = get_offset_date_str(end, 1), interval = '1d', progress = False)
-			df = df.drop('Adj Close', axis = 1)
-		else:
-			df = joblib.load('./cache/{}.che'.format(symbol))
+	if yf_on and for_backup: yf_flights.do(('refresh', symbol), refresh_symbol, symbol)
 
-		if for_backup:
-			joblib.dump(df, './cache/{}.che'.format(symbol))
-			yf_caches[symbol] = df     
-
-	df = df.dropna()
-	df = df.round(4)
- 
 	end = get_offset_date_str(end, 1)
-	df = df.loc[start:datetime.strptime(end, YMD_FORMAT)]
-
-	agg_dict = {
-		'Open': 'first',
-		'Close': 'last',
-		'High': 'max',
-		'Low': 'min',
-		'Volume': 'sum'
-	}  
-	df = df.groupby(pd.Grouper(freq = INTERVAL_LETTER_DICT[interval])).agg(agg_dict)
-	df = df.dropna()
+
+	# Symbols not refreshed into the store in this process are downloaded for the requested range only
+	if yf_on and symbol not in yf_refreshed:
+		df = load_cached((symbol, start, end, get_today_str()), lambda: yf_provider.fetch(symbol, start, end))
+		df = df.dropna()
+		df = df.round(4)
+		df = df.loc[start:datetime.strptime(end, YMD_FORMAT)]
+		df = resample_prices(df, interval)
+	else:
+		df = slice_price_view(symbol, start, datetime.strptime(end, YMD_FORMAT), interval)
+
+	df = df[list(INTERVAL_AGG_DICT)]
 
 	if len(df) == 0: return df
 	last_day = df.iloc[-1].name.strftime(YMD_FORMAT)
 
 	if last_day > end:
 		if fit_today:
-			idx_list = df.index.to_list()
+			idx_list = df.index.to_numpy().copy()
 			idx_list[-1] = datetime.strptime(end, YMD_FORMAT)
-			df.index = idx_list
+			df.index = pd.DatetimeIndex(idx_list)
 		else:
 			df = df[:-1]
 	